@@ -0,0 +1,217 @@
+import argparse
+import csv
+import json
+import os
+import sys
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, as_completed, wait
+
+from card_profile import collect_timings
+from card_prefetch import is_url, prefetch, prefetch_fonts
+from card_layout import resolve_formats
+from card_render import CardSpec, IMAGE_FORMATS, MAX_BACKGROUND_BYTES, QUALITY, slugify
+from card_results import render_encoded
+
+# --------------------
+# Geração em lote
+# --------------------
+# Lê um CSV ou JSONL de cards (uma linha por card, colunas = campos do
+# CardSpec) e desenha cada card em cada formato num pool de processos.
+# Cada card é um job: o fundo é descarregado e descodificado uma vez e
+# serve todos os formatos pedidos. Fontes e imagens remotas são descarregadas
+# em paralelo antes/durante o render e cada job entra no pool assim que o
+# seu fundo chega, mas só até SUBMIT_WINDOW jobs por worker: com a janela
+# cheia o lote deixa de pedir fundos ao prefetch, para os bytes de uma
+# campanha grande não ficarem todos em memória à espera de um worker.
+#
+#   python card_batch.py campanha.csv --out cards/ --formats Feed Story
+
+SUBMIT_WINDOW = 2
+
+# Nomes alternativos aceites nas colunas
+ALIASES = {
+    "accent": "accent_color",
+    "color": "accent_color",
+    "cor": "accent_color",
+    "image": "image_source",
+    "image_url": "image_source",
+    "imagem": "image_source",
+    "format": "fmt",
+}
+
+
+def read_specs(path):
+    if path.lower().endswith((".jsonl", ".ndjson")):
+        rows = []
+        with open(path, "r", encoding="utf-8") as f:
+            for line in f:
+                if line.strip():
+                    rows.append(json.loads(line))
+    else:
+        with open(path, "r", encoding="utf-8-sig", newline="") as f:
+            rows = list(csv.DictReader(f))
+
+    specs = []
+    for row in rows:
+        row = {ALIASES.get(k.strip().lower(), k.strip().lower()): v for k, v in row.items() if k}
+        specs.append(CardSpec.from_dict(row))
+    return specs
+
+
+def output_name(index, spec, fmt, image_format):
+    ext = IMAGE_FORMATS[image_format.upper()][1]
+    return f"{index:03d}_{slugify(spec.destination)}_{slugify(fmt.split()[0])}.{ext}"
+
+
+def _render_job(job):
+    # Corre num processo do pool: devolve [(caminho, erro, segundos, tempos), ...]
+    with collect_timings() as timings:
+        results = _render_outputs(job)
+    stats = timings.as_dict()
+    return [r + (stats,) for r in results]
+
+
+def _render_outputs(job):
+    spec, outputs, encoding, quality, background, use_cache = job
+    start = time.perf_counter()
+    try:
+        # Só os formatos que não estão na cache de resultados são desenhados
+        files = render_encoded(spec, list(outputs), background, encoding, quality, use_cache)
+    except Exception as e:
+        error = f"{type(e).__name__}: {e}"
+        seconds = (time.perf_counter() - start) / len(outputs)
+        return [(path, error, seconds) for path in outputs.values()]
+
+    results = []
+    per_card = (time.perf_counter() - start) / len(outputs)
+    for fmt, path in outputs.items():
+        t = time.perf_counter()
+        try:
+            with open(path, "wb") as f:
+                f.write(files[fmt])
+            results.append((path, None, per_card + time.perf_counter() - t))
+        except Exception as e:
+            results.append((path, f"{type(e).__name__}: {e}", per_card + time.perf_counter() - t))
+    return results
+
+
+def build_jobs(specs, formats, out_dir, encoding=None, quality="balanced", use_cache=True):
+    # encoding: argumentos de encode_card (image_format, quality, progressive, ...)
+    encoding = dict(encoding or {"image_format": "PNG"})
+    jobs = []
+    for i, spec in enumerate(specs, start=1):
+        outputs = {fmt: os.path.join(out_dir, output_name(i, spec, fmt, encoding["image_format"])) for fmt in formats}
+        jobs.append((spec, outputs, encoding, quality, None, use_cache))
+    return jobs
+
+
+def run_batch(specs, formats, out_dir, workers=None, encoding=None, quality="balanced",
+              concurrency=8, timeout=15, retries=2, log=print, json_log=False, use_cache=True):
+    os.makedirs(out_dir, exist_ok=True)
+    jobs = build_jobs(specs, formats, out_dir, encoding, quality, use_cache)
+    total = len(jobs) * len(formats)
+    results = []
+    start = time.perf_counter()
+
+    def report(items):
+        for path, error, seconds, timings in items:
+            results.append((path, error, seconds, timings))
+            if json_log:
+                # Uma linha JSON por card; "job" são os tempos do job (todos os formatos do card)
+                log(json.dumps({"event": "card", "n": len(results), "total": total, "path": path,
+                                "ok": error is None, "error": error, "seconds": round(seconds, 4),
+                                "job": timings}, ensure_ascii=False))
+                continue
+            status = "ok" if error is None else f"ERRO {error}"
+            log(f"[{len(results)}/{total}] {os.path.basename(path)} ({seconds:.2f}s) {status}")
+
+    # Fontes primeiro: os workers passam a lê-las da cache em disco
+    for url, error in prefetch_fonts(concurrency, timeout, retries).items():
+        if json_log:
+            log(json.dumps({"event": "font_unavailable", "url": url, "error": error}))
+        else:
+            log(f"Aviso: fonte indisponível ({error}): {url}")
+
+    waiting = {}
+    ready = []
+    for job in jobs:
+        source = job[0].image_source
+        if is_url(source):
+            waiting.setdefault(source, []).append(job)
+        else:
+            ready.append(job)
+
+    window = SUBMIT_WINDOW * (workers or os.cpu_count() or 1)
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = {pool.submit(_render_job, job) for job in ready}
+
+        def collect(block=False):
+            done = wait(futures, return_when=FIRST_COMPLETED).done if block else {f for f in futures if f.done()}
+            for fut in done:
+                report(fut.result())
+            futures.difference_update(done)
+
+        for url, data, error in prefetch(waiting, concurrency, timeout, retries,
+                                         max_bytes=MAX_BACKGROUND_BYTES):
+            for job in waiting[url]:
+                if data is None:
+                    report((path, error, 0.0, None) for path in job[1].values())
+                    continue
+                # Janela cheia: espera por um card antes de aceitar mais um fundo
+                while len(futures) >= window:
+                    collect(block=True)
+                # O worker recebe os bytes já descarregados e só descodifica
+                futures.add(pool.submit(_render_job, job[:4] + (data,) + job[5:]))
+            collect()
+        for fut in as_completed(futures):
+            report(fut.result())
+
+    elapsed = time.perf_counter() - start
+    failed = [r for r in results if r[1] is not None]
+    # Os tempos repetem-se em todos os formatos do mesmo job: conta cada job uma vez
+    jobs_timings = {id(r[3]): r[3] for r in results if r[3]}.values()
+    cached = sum(t["counters"].get("result_hits", 0) for t in jobs_timings)
+    if json_log:
+        log(json.dumps({"event": "summary", "ok": total - len(failed), "failed": len(failed), "total": total,
+                        "cached": cached, "seconds": round(elapsed, 3),
+                        "cards_per_s": round(total / elapsed, 3) if elapsed else 0}))
+    else:
+        log(f"{total - len(failed)}/{total} cards em {elapsed:.1f}s ({total / elapsed if elapsed else 0:.1f} cards/s, "
+            f"{cached} da cache)")
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Gera cards de viagem em lote a partir de um CSV/JSONL.")
+    parser.add_argument("input", help="ficheiro .csv ou .jsonl com um card por linha")
+    parser.add_argument("--out", default="cards", help="pasta de saída (por defeito: cards)")
+    parser.add_argument("--formats", nargs="*", help="formatos a gerar (por defeito: todos)")
+    parser.add_argument("--workers", type=int, default=None, help="número de processos (por defeito: núcleos do CPU)")
+    parser.add_argument("--image-format", default="PNG", type=str.upper, choices=tuple(IMAGE_FORMATS))
+    parser.add_argument("--encode-quality", type=int, help="qualidade JPEG/WEBP (1-100)")
+    parser.add_argument("--progressive", action="store_true", help="JPEG progressivo")
+    parser.add_argument("--compress-level", type=int, choices=range(10), metavar="0-9", help="compressão PNG (0-9)")
+    parser.add_argument("--optimize", action="store_true", help="passagem extra de otimização (PNG/JPEG)")
+    parser.add_argument("--quality", default="balanced", choices=tuple(QUALITY), help="qualidade do redimensionamento do fundo")
+    parser.add_argument("--concurrency", type=int, default=8, help="downloads em simultâneo (por defeito: 8)")
+    parser.add_argument("--timeout", type=float, default=15, help="timeout de cada download em segundos")
+    parser.add_argument("--retries", type=int, default=2, help="novas tentativas por download falhado")
+    parser.add_argument("--no-cache", action="store_true", help="não usar a cache de cards já gerados")
+    parser.add_argument("--json-log", action="store_true", help="progresso em JSON (uma linha por card, com tempos por etapa)")
+    args = parser.parse_args(argv)
+
+    specs = read_specs(args.input)
+    try:
+        formats = resolve_formats(args.formats)
+    except ValueError as e:
+        parser.error(str(e))
+    encoding = {"image_format": args.image_format, "quality": args.encode_quality, "progressive": args.progressive,
+                "compress_level": args.compress_level, "optimize": args.optimize}
+    results = run_batch(specs, formats, args.out, args.workers, encoding, args.quality,
+                        args.concurrency, args.timeout, args.retries,
+                        log=lambda msg: print(msg, file=sys.stderr), json_log=args.json_log, use_cache=not args.no_cache)
+    return 1 if any(r[1] for r in results) else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,366 @@
+import argparse
+import hashlib
+import http.server
+import json
+import multiprocessing
+import os
+import platform
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+from functools import partial
+
+from PIL import Image, ImageDraw, ImageFont, __version__ as PIL_VERSION
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+# --------------------
+# Benchmark dos renderers
+# --------------------
+# Desenha um corpus fixo de cards com fundos sintéticos através do pipeline do
+# travel_card_generator (card_render) e do create_travel_card de cada
+# travel_card_*.py. Tudo offline: fontes e imagens vêm de fixtures locais
+# servidas por um servidor HTTP em 127.0.0.1. A fonte das fixtures é sempre a
+# mesma (a TrueType embutida no Pillow, nos três pesos) e o seu sha256 fica
+# no JSON: a cache de fontes de quem corre não muda os tamanhos do texto. Cada caso corre num processo
+# novo, para o pico de RSS ser só dele. O resultado fica num JSON que pode
+# ser comparado entre commits:
+#
+#   python card_bench.py --out bench_results/depois.json --compare bench_results/antes.json
+
+RENDERERS = ("generator", "complete", "enhanced", "simple")
+
+# nome -> (largura, altura, formato do ficheiro, orientação EXIF)
+BACKGROUNDS = {
+    "small_png": (640, 480, "PNG", None),
+    "jpeg_12mp_exif": (4000, 3000, "JPEG", 6),
+    "panorama": (12000, 3000, "JPEG", None),
+}
+
+FONT_FILES = {
+    "regular": "Montserrat-Regular.ttf",
+    "semibold": "Montserrat-SemiBold.ttf",
+    "bold": "Montserrat-Bold.ttf",
+}
+
+CORPUS = [
+    {"destination": "NÁPOLES", "price": "409€", "subtitle": "Entre o sabor da pizza e a vista do Vesúvio – Nápoles encanta"},
+    {"destination": "RIO DE JANEIRO", "price": "1299€", "subtitle": "Praias, samba e o Cristo Redentor"},
+    {"destination": "ROMA", "price": "299€", "subtitle": "A cidade eterna"},
+]
+
+
+# --------------------
+# Fixtures
+# --------------------
+def _synthetic_image(width, height):
+    # Gradientes e uma grelha: determinístico e com algum detalhe para o JPEG
+    r = Image.linear_gradient("L").resize((width, height))
+    g = Image.linear_gradient("L").rotate(90).resize((width, height))
+    b = Image.radial_gradient("L").resize((width, height))
+    img = Image.merge("RGB", (r, g, b))
+    draw = ImageDraw.Draw(img)
+    step = max(16, min(width, height) // 24)
+    for x in range(0, width, step):
+        draw.line((x, 0, x, height), fill=(255, 255, 255), width=2)
+    for y in range(0, height, step):
+        draw.line((0, y, width, y), fill=(0, 0, 0), width=2)
+    return img
+
+
+def _font_fixture_bytes():
+    # Determinística para cada versão do Pillow (também registada no JSON)
+    return ImageFont.load_default().font_bytes
+
+
+def font_digests(path):
+    digests = {}
+    for weight, name in FONT_FILES.items():
+        with open(os.path.join(path, name), "rb") as f:
+            digests[weight] = hashlib.sha256(f.read()).hexdigest()
+    return digests
+
+
+def build_fixtures(path):
+    os.makedirs(path, exist_ok=True)
+    # As fontes são sempre reescritas: uma pasta --fixtures antiga pode ter outras
+    font = _font_fixture_bytes()
+    for name in FONT_FILES.values():
+        with open(os.path.join(path, name), "wb") as f:
+            f.write(font)
+    for name, (w, h, fmt, orientation) in BACKGROUNDS.items():
+        target = os.path.join(path, f"{name}.{fmt.lower()}")
+        if os.path.exists(target):
+            continue
+        img = _synthetic_image(w, h)
+        if fmt == "JPEG":
+            exif = Image.Exif()
+            if orientation:
+                exif[0x0112] = orientation
+            img.save(target, quality=90, exif=exif.tobytes())
+        else:
+            img.save(target)
+    return path
+
+
+class FixtureServer:
+    def __init__(self, root):
+        handler = partial(_QuietHandler, directory=root)
+        self.httpd = http.server.ThreadingHTTPServer(("127.0.0.1", 0), handler)
+        self.thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+
+    @property
+    def base_url(self):
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def __enter__(self):
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+
+class _QuietHandler(http.server.SimpleHTTPRequestHandler):
+    def log_message(self, *args):
+        pass
+
+
+# --------------------
+# Casos (cada um corre num processo novo)
+# --------------------
+def _peak_rss_mb():
+    # VmHWM é por espaço de memória e recomeça no exec; ru_maxrss (Linux)
+    # herda o pico do processo pai, por isso só serve de recurso
+    try:
+        with open("/proc/self/status", "r") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return round(int(line.split()[1]) / 1024, 1)
+    except OSError:
+        pass
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux devolve KB, macOS bytes
+    return round(peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024, 1)
+
+
+def _make_renderer(name, image_url):
+    from card_render import CardSpec, encode_card, render_card
+
+    if name == "generator":
+        def render(card, fmt, size):
+            spec = CardSpec(destination=card["destination"], price=card["price"], subtitle=card["subtitle"],
+                            fmt=fmt, image_source=image_url)
+            return encode_card(render_card(spec))
+        return render
+
+    if name in ("complete", "enhanced"):
+        import importlib
+        module = importlib.import_module(f"travel_card_{name}")
+        mode = "url" if name == "complete" else "url_da_web"
+
+        def render(card, fmt, size):
+            data = {
+                "consultor_line1": "CONSULTOR INDEPENDENTE RNAVT3301",
+                "consultor_line2": "iCliGo travel consultant",
+                "destination": card["destination"], "subtitle": card["subtitle"],
+                "price_label": "DESDE", "price": card["price"], "price_by": "POR PESSOA",
+                "footer": "VALOR BASEADO EM 2 ADULTOS. PREÇOS SUJEITOS A ALTERAÇÕES.",
+                "image_mode": mode, "upload_image": None, "image_url": image_url,
+                "accent_color": "#00ffae",
+            }
+            for i, (emoji, text) in enumerate([("✈", "PORTO"), ("🏨", "HOTEL"), ("🍽", "PEQUENO\nALMOÇO"),
+                                                ("💼", "BAGAGEM"), ("🚐", "TRANSFER")], start=1):
+                data[f"icon{i}_emoji"] = emoji
+                data[f"icon{i}_text"] = text
+            return encode_card(module.create_travel_card(data, *size))
+        return render
+
+    if name == "simple":
+        import travel_card_simple
+
+        def render(card, fmt, size):
+            img = travel_card_simple.create_travel_card(card["destination"], card["price"], card["subtitle"],
+                                                        image_url, *size)
+            return encode_card(img)
+        return render
+
+    raise ValueError(f"Renderer desconhecido: {name}")
+
+
+def run_case(case):
+    # Corre num processo novo: aponta fontes e cache para as fixtures e mede
+    os.environ["CARD_CACHE_DIR"] = case["cache_dir"]
+    import card_fonts
+    for weight, name in FONT_FILES.items():
+        card_fonts.FONT_URLS[weight] = f"{case['base_url']}/{name}"
+    from card_layout import FORMATS
+    from card_profile import collect_timings
+
+    render = _make_renderer(case["renderer"], case["image_url"])
+    jobs = [(card, fmt, FORMATS[fmt]) for card in CORPUS for fmt in case["formats"]]
+
+    for job in jobs[:case["warmup"]]:
+        render(*job)
+
+    latencies = []
+    stages = {}
+    start = time.perf_counter()
+    for _ in range(case["iterations"]):
+        for job in jobs:
+            with collect_timings() as t:
+                render(*job)
+            latencies.append(t.total)
+            for name, seconds in t.stages.items():
+                stages.setdefault(name, []).append(seconds)
+    elapsed = time.perf_counter() - start
+
+    # Uma passagem extra com tracemalloc, fora das medições de tempo
+    tracemalloc.start()
+    with collect_timings() as traced:
+        render(*jobs[0])
+    _, alloc_peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    latencies.sort()
+    return {
+        "renderer": case["renderer"],
+        "background": case["background"],
+        "formats": case["formats"],
+        "cards": len(latencies),
+        "p50_ms": round(percentile(latencies, 50) * 1000, 2),
+        "p95_ms": round(percentile(latencies, 95) * 1000, 2),
+        "mean_ms": round(statistics.fmean(latencies) * 1000, 2),
+        "cards_per_s": round(len(latencies) / elapsed, 3) if elapsed else None,
+        "peak_rss_mb": _peak_rss_mb(),
+        "stages_mean_ms": {k: round(statistics.fmean(v) * 1000, 3) for k, v in stages.items()},
+        "alloc_peak_bytes": alloc_peak,
+        "alloc_peak_bytes_per_stage": traced.alloc_peak,
+    }
+
+
+def percentile(sorted_values, p):
+    if not sorted_values:
+        return 0.0
+    k = (len(sorted_values) - 1) * p / 100
+    lo = int(k)
+    hi = min(lo + 1, len(sorted_values) - 1)
+    return sorted_values[lo] + (sorted_values[hi] - sorted_values[lo]) * (k - lo)
+
+
+# --------------------
+# Execução e comparação
+# --------------------
+def _git_commit():
+    try:
+        out = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                             cwd=os.path.dirname(os.path.abspath(__file__)), timeout=10)
+        return out.stdout.strip() or None
+    except Exception:
+        return None
+
+
+def run_bench(renderers, backgrounds, formats, iterations=3, warmup=1, fixtures=None, log=print):
+    workdir = tempfile.mkdtemp(prefix="card_bench_")
+    fixtures = build_fixtures(fixtures or os.path.join(workdir, "fixtures"))
+    fonts = font_digests(fixtures)
+    ctx = multiprocessing.get_context("spawn")
+    results = []
+    try:
+        with FixtureServer(fixtures) as server:
+            for renderer in renderers:
+                for background in backgrounds:
+                    ext = BACKGROUNDS[background][2].lower()
+                    case = {
+                        "renderer": renderer,
+                        "background": background,
+                        "formats": formats,
+                        "iterations": iterations,
+                        "warmup": warmup,
+                        "base_url": server.base_url,
+                        "image_url": f"{server.base_url}/{background}.{ext}",
+                        # Cache própria por caso: começa fria, aquece no warmup
+                        "cache_dir": os.path.join(workdir, f"cache_{renderer}_{background}"),
+                    }
+                    with ctx.Pool(1) as pool:
+                        result = pool.apply(run_case, (case,))
+                    results.append(result)
+                    log(f"{renderer:<10} {background:<15} p50 {result['p50_ms']:>8.1f} ms  "
+                        f"p95 {result['p95_ms']:>8.1f} ms  {result['cards_per_s']:>6.2f} cards/s  "
+                        f"RSS {result['peak_rss_mb']} MB")
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    return {
+        "meta": {
+            "commit": _git_commit(),
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "python": platform.python_version(),
+            "pillow": PIL_VERSION,
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "iterations": iterations,
+            "warmup": warmup,
+            "formats": formats,
+            "fonts": fonts,
+        },
+        "results": results,
+    }
+
+
+def compare(new, old, log=print):
+    old_by_key = {(r["renderer"], r["background"]): r for r in old["results"]}
+    log(f"Comparação com {old['meta'].get('commit') or '?'}:")
+    if new["meta"].get("fonts") != old["meta"].get("fonts"):
+        log("  Aviso: as fontes das fixtures são diferentes; os tempos do texto não são comparáveis")
+    for r in new["results"]:
+        before = old_by_key.get((r["renderer"], r["background"]))
+        if not before:
+            continue
+        for metric in ("p50_ms", "p95_ms"):
+            delta = (r[metric] - before[metric]) / before[metric] * 100 if before[metric] else 0.0
+            log(f"  {r['renderer']:<10} {r['background']:<15} {metric} {before[metric]:>8.1f} -> {r[metric]:>8.1f} ({delta:+.1f}%)")
+
+
+def main(argv=None):
+    from card_layout import FORMATS
+
+    parser = argparse.ArgumentParser(description="Benchmark offline dos renderers de cards.")
+    parser.add_argument("--renderers", nargs="*", default=list(RENDERERS), choices=RENDERERS)
+    parser.add_argument("--backgrounds", nargs="*", default=list(BACKGROUNDS), choices=list(BACKGROUNDS))
+    parser.add_argument("--formats", nargs="*", default=list(FORMATS), help="formatos (nomes completos)")
+    parser.add_argument("--iterations", type=int, default=3, help="passagens pelo corpus em cada caso")
+    parser.add_argument("--warmup", type=int, default=1, help="renders de aquecimento (não medidos)")
+    parser.add_argument("--fixtures", help="pasta de fixtures (criada se não existir); por defeito temporária")
+    parser.add_argument("--out", help="ficheiro JSON de resultados (por defeito bench_results/<commit>.json)")
+    parser.add_argument("--compare", help="JSON de uma corrida anterior para comparar")
+    args = parser.parse_args(argv)
+
+    report = run_bench(args.renderers, args.backgrounds, args.formats, args.iterations, args.warmup, args.fixtures)
+
+    out = args.out or os.path.join("bench_results", f"{report['meta']['commit'] or 'local'}.json")
+    os.makedirs(os.path.dirname(out) or ".", exist_ok=True)
+    with open(out, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2, ensure_ascii=False)
+    print(f"Resultados em {out}")
+
+    if args.compare:
+        with open(args.compare, "r", encoding="utf-8") as f:
+            compare(report, json.load(f))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
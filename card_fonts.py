@@ -0,0 +1,269 @@
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from io import BytesIO
+
+from PIL import ImageFont
+
+from card_http import CACHE_DIR, fetch_bytes
+from card_profile import count as count_event
+
+# --------------------
+# Fontes partilhadas por todo o processo
+# --------------------
+# Cada ficheiro de fonte é descarregado uma única vez. Os bytes ficam numa
+# cache em disco endereçada pelo conteúdo (sha256), que sobrevive a reinícios,
+# e as instâncias FreeTypeFont ficam numa LRU em memória por (fonte, tamanho).
+
+FONT_URLS = {
+    "regular": "https://github.com/google/fonts/raw/main/ofl/montserrat/Montserrat-Regular.ttf",
+    "semibold": "https://github.com/google/fonts/raw/main/ofl/montserrat/Montserrat-SemiBold.ttf",
+    "bold": "https://github.com/google/fonts/raw/main/ofl/montserrat/Montserrat-Bold.ttf",
+}
+
+FONT_DIR = os.path.join(CACHE_DIR, "fonts")
+FONT_LRU_SIZE = int(os.environ.get("CARD_FONT_LRU_SIZE", "64"))
+FAILED_RETRY_SECONDS = 60
+
+_lock = threading.RLock()
+_url_locks = {}
+_font_bytes = {}        # url -> bytes
+_failed = {}            # url -> instante da última falha
+_fonts = OrderedDict()  # (url, size) -> FreeTypeFont
+_digests = {}           # url -> sha256 dos bytes
+_stats = {"hits": 0, "misses": 0, "evictions": 0, "downloads": 0, "disk_hits": 0}
+
+
+def _resolve(font):
+    # Aceita o nome curto ("bold") ou o URL completo
+    return FONT_URLS.get(font, font)
+
+
+def _index_path():
+    return os.path.join(FONT_DIR, "index.json")
+
+
+def _read_index():
+    try:
+        with open(_index_path(), "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def _atomic_write(path, data, mode="wb"):
+    tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(tmp, mode) as f:
+        f.write(data)
+    os.replace(tmp, path)
+
+
+def _blob_path(digest):
+    return os.path.join(FONT_DIR, f"{digest}.ttf")
+
+
+def _load_from_disk(url):
+    digest = _read_index().get(url)
+    if not digest:
+        return None
+    try:
+        with open(_blob_path(digest), "rb") as f:
+            data = f.read()
+    except OSError:
+        return None
+    # Confirma que o conteúdo corresponde ao endereço
+    if hashlib.sha256(data).hexdigest() != digest:
+        return None
+    return data
+
+
+def _store_on_disk(url, data):
+    try:
+        os.makedirs(FONT_DIR, exist_ok=True)
+        digest = hashlib.sha256(data).hexdigest()
+        if not os.path.exists(_blob_path(digest)):
+            _atomic_write(_blob_path(digest), data)
+        with _lock:
+            index = _read_index()
+            index[url] = digest
+            _atomic_write(_index_path(), json.dumps(index, indent=2), mode="w")
+    except OSError:
+        pass
+
+
+def _download(url, timeout=12):
+    # As fontes têm a sua própria cache por conteúdo; aqui só se usa o pool
+    try:
+        return fetch_bytes(url, timeout=timeout, use_cache=False)
+    except Exception:
+        return None
+
+
+def font_bytes(font):
+    url = _resolve(font)
+    with _lock:
+        data = _font_bytes.get(url)
+        if data is not None:
+            return data
+        failed_at = _failed.get(url)
+        if failed_at is not None and time.monotonic() - failed_at < FAILED_RETRY_SECONDS:
+            return None
+        url_lock = _url_locks.setdefault(url, threading.Lock())
+
+    # Um único download por URL, mesmo com várias threads a pedir ao mesmo tempo
+    with url_lock:
+        with _lock:
+            data = _font_bytes.get(url)
+        if data is not None:
+            return data
+
+        data = _load_from_disk(url)
+        if data is not None:
+            with _lock:
+                _stats["disk_hits"] += 1
+            count_event("font_disk_hits")
+        else:
+            data = _download(url)
+            if data is None:
+                with _lock:
+                    _failed[url] = time.monotonic()
+                return None
+            with _lock:
+                _stats["downloads"] += 1
+            count_event("font_downloads")
+            _store_on_disk(url, data)
+
+        with _lock:
+            _font_bytes[url] = data
+            _failed.pop(url, None)
+        return data
+
+
+def local_font_bytes(font):
+    # Como font_bytes, mas só memória e cache em disco: nunca vai à rede
+    url = _resolve(font)
+    with _lock:
+        data = _font_bytes.get(url)
+    if data is None:
+        data = _load_from_disk(url)
+        if data is not None:
+            with _lock:
+                _font_bytes.setdefault(url, data)
+                _failed.pop(url, None)
+    return data
+
+
+def remember_font_bytes(font, data):
+    # Regista bytes obtidos por outra via (ex: pré-carregamento de um lote)
+    url = _resolve(font)
+    _store_on_disk(url, data)
+    with _lock:
+        _font_bytes[url] = data
+        _digests.pop(url, None)
+        _failed.pop(url, None)
+
+
+def font_digest(font):
+    # Versão da fonte (sha256 do ficheiro), ou None se não estiver disponível
+    url = _resolve(font)
+    with _lock:
+        digest = _digests.get(url)
+    if digest is None:
+        data = font_bytes(url)
+        if data is None:
+            return None
+        digest = hashlib.sha256(data).hexdigest()
+        with _lock:
+            _digests[url] = digest
+    return digest
+
+
+def get_font(font, size):
+    url = _resolve(font)
+    key = (url, int(size))
+    f = _cached(key)
+    if f is not None:
+        return f
+
+    data = font_bytes(url)
+    if data is None:
+        # Sem rede nem cache: fonte por defeito, sem a guardar na LRU
+        return ImageFont.load_default()
+    try:
+        f = ImageFont.truetype(BytesIO(data), size=int(size))
+    except Exception:
+        return ImageFont.load_default()
+
+    _remember(key, f)
+    return f
+
+
+def _cached(key):
+    with _lock:
+        f = _fonts.get(key)
+        if f is not None:
+            _fonts.move_to_end(key)
+            _stats["hits"] += 1
+        else:
+            _stats["misses"] += 1
+    count_event("font_hits" if f is not None else "font_misses")
+    return f
+
+
+def _remember(key, f):
+    with _lock:
+        _fonts[key] = f
+        _fonts.move_to_end(key)
+        while len(_fonts) > FONT_LRU_SIZE:
+            _fonts.popitem(last=False)
+            _stats["evictions"] += 1
+
+
+def safe_truetype_from_url(url, size):
+    return get_font(url, size)
+
+
+def font_stats():
+    with _lock:
+        return dict(_stats, cached_fonts=len(_fonts), cached_files=len(_font_bytes))
+
+
+def clear_font_cache(disk=False):
+    with _lock:
+        _fonts.clear()
+        _font_bytes.clear()
+        _digests.clear()
+        _failed.clear()
+        for k in _stats:
+            _stats[k] = 0
+    if disk:
+        try:
+            for name in os.listdir(FONT_DIR):
+                os.remove(os.path.join(FONT_DIR, name))
+        except OSError:
+            pass
+
+
+# --------------------
+# Fontes do sistema (variantes simples dos cards)
+# --------------------
+SYSTEM_FONTS = ("arial.ttf", "calibri.ttf", "verdana.ttf")
+
+
+def system_font(size, bold=False):
+    # Tenta as fontes do sistema por ordem; sem nenhuma, usa a fonte por defeito
+    for name in SYSTEM_FONTS:
+        key = (name, int(size))
+        f = _cached(key)
+        if f is not None:
+            return f
+        try:
+            f = ImageFont.truetype(name, int(size))
+        except OSError:
+            continue
+        _remember(key, f)
+        return f
+    return ImageFont.load_default()
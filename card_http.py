@@ -0,0 +1,281 @@
+import hashlib
+import json
+import os
+import threading
+import time
+from concurrent.futures import Future
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from card_profile import count as count_event
+
+# --------------------
+# Cliente HTTP partilhado para imagens e fontes
+# --------------------
+# Uma única requests.Session com pool de ligações, cache em disco com
+# revalidação (ETag / Last-Modified) e limite de tamanho com despejo LRU, e
+# deduplicação de pedidos em curso: vários renders a pedir o mesmo URL ao
+# mesmo tempo resultam num só download. Com max_bytes o corpo é lido aos
+# bocados e o download é abortado mal passe o limite (ou logo pelo
+# Content-Length), antes de ficar todo em memória ou na cache.
+
+CACHE_DIR = os.environ.get(
+    "CARD_CACHE_DIR",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), ".card_cache"),
+)
+HTTP_DIR = os.path.join(CACHE_DIR, "http")
+HTTP_CACHE_MAX_BYTES = int(os.environ.get("CARD_HTTP_CACHE_MAX_BYTES", str(256 * 1024 * 1024)))
+# Sem Cache-Control do servidor, uma resposta guardada é usada sem revalidar durante este tempo
+DEFAULT_FRESH_SECONDS = 300
+POOL_SIZE = 16
+CHUNK_BYTES = 64 * 1024
+USER_AGENT = "travel-card-generator/1.0"
+
+_lock = threading.Lock()
+_session = None
+_inflight = {}  # url -> Future
+_stats = {"requests": 0, "fresh_hits": 0, "revalidated": 0, "downloads": 0,
+          "bytes_fetched": 0, "deduplicated": 0, "evictions": 0, "errors": 0}
+
+
+class ResponseTooLarge(RuntimeError):
+    pass
+
+
+def get_session():
+    global _session
+    with _lock:
+        if _session is None:
+            s = requests.Session()
+            adapter = HTTPAdapter(pool_connections=POOL_SIZE, pool_maxsize=POOL_SIZE)
+            s.mount("http://", adapter)
+            s.mount("https://", adapter)
+            s.headers["User-Agent"] = USER_AGENT
+            _session = s
+        return _session
+
+
+def _count(key, n=1):
+    with _lock:
+        _stats[key] += n
+    count_event(f"http_{key}", n)
+
+
+# --------------------
+# Cache em disco
+# --------------------
+def _paths(url):
+    key = hashlib.sha256(url.encode("utf-8")).hexdigest()
+    return os.path.join(HTTP_DIR, f"{key}.body"), os.path.join(HTTP_DIR, f"{key}.json")
+
+
+def _read_cached(url):
+    body_path, meta_path = _paths(url)
+    try:
+        with open(meta_path, "r", encoding="utf-8") as f:
+            meta = json.load(f)
+        with open(body_path, "rb") as f:
+            body = f.read()
+    except (OSError, ValueError):
+        return None, None
+    if meta.get("url") != url or meta.get("size") != len(body):
+        return None, None
+    return meta, body
+
+
+def _touch(url):
+    # O mtime do corpo marca o último acesso (para o despejo LRU)
+    try:
+        os.utime(_paths(url)[0])
+    except OSError:
+        pass
+
+
+def _max_age(headers):
+    for part in headers.get("Cache-Control", "").split(","):
+        part = part.strip().lower()
+        if part in ("no-cache", "no-store"):
+            return 0
+        if part.startswith("max-age="):
+            try:
+                return int(part.split("=", 1)[1])
+            except ValueError:
+                pass
+    return DEFAULT_FRESH_SECONDS
+
+
+def _write_cached(url, body, headers):
+    if "no-store" in headers.get("Cache-Control", "").lower():
+        return
+    body_path, meta_path = _paths(url)
+    meta = {
+        "url": url,
+        "etag": headers.get("ETag"),
+        "last_modified": headers.get("Last-Modified"),
+        "max_age": _max_age(headers),
+        "stored_at": time.time(),
+        "size": len(body),
+    }
+    try:
+        os.makedirs(HTTP_DIR, exist_ok=True)
+        tmp = f"{body_path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp, "wb") as f:
+            f.write(body)
+        os.replace(tmp, body_path)
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(meta, f)
+        os.replace(tmp, meta_path)
+    except OSError:
+        return
+    _evict()
+
+
+def _refresh_meta(url, meta, headers):
+    meta = dict(meta, stored_at=time.time(), max_age=_max_age(headers))
+    if headers.get("ETag"):
+        meta["etag"] = headers["ETag"]
+    if headers.get("Last-Modified"):
+        meta["last_modified"] = headers["Last-Modified"]
+    try:
+        with open(_paths(url)[1], "w", encoding="utf-8") as f:
+            json.dump(meta, f)
+    except OSError:
+        pass
+    _touch(url)
+
+
+def _evict():
+    try:
+        entries = []
+        for name in os.listdir(HTTP_DIR):
+            if name.endswith(".body"):
+                path = os.path.join(HTTP_DIR, name)
+                st = os.stat(path)
+                entries.append((st.st_mtime, st.st_size, path))
+    except OSError:
+        return
+    total = sum(size for _, size, _ in entries)
+    for _, size, path in sorted(entries):
+        if total <= HTTP_CACHE_MAX_BYTES:
+            break
+        for p in (path, path[:-len(".body")] + ".json"):
+            try:
+                os.remove(p)
+            except OSError:
+                pass
+        total -= size
+        _count("evictions")
+
+
+# --------------------
+# Pedidos
+# --------------------
+def _check_size(size, max_bytes):
+    if max_bytes is not None and size > max_bytes:
+        raise ResponseTooLarge(f"Resposta demasiado grande: mais de {max_bytes / 1e6:.0f} MB")
+
+
+def _read_body(r, max_bytes):
+    # Corpo da resposta, lido aos bocados para parar assim que passe max_bytes
+    if max_bytes is None:
+        return r.content
+    length = r.headers.get("Content-Length", "")
+    if length.isdigit():
+        _check_size(int(length), max_bytes)
+    chunks, total = [], 0
+    for chunk in r.iter_content(CHUNK_BYTES):
+        total += len(chunk)
+        _check_size(total, max_bytes)
+        chunks.append(chunk)
+    return b"".join(chunks)
+
+
+def _fetch(url, timeout, use_cache, max_bytes=None):
+    meta, body = _read_cached(url) if use_cache else (None, None)
+    if meta is not None and time.time() - meta["stored_at"] < meta.get("max_age", 0):
+        _check_size(len(body), max_bytes)
+        _count("fresh_hits")
+        _touch(url)
+        return body
+
+    headers = {}
+    if meta is not None:
+        if meta.get("etag"):
+            headers["If-None-Match"] = meta["etag"]
+        if meta.get("last_modified"):
+            headers["If-Modified-Since"] = meta["last_modified"]
+
+    _count("requests")
+    try:
+        r = get_session().get(url, headers=headers, timeout=timeout, stream=True)
+    except requests.RequestException:
+        # Sem rede: uma cópia antiga é melhor do que nenhuma
+        if body is not None:
+            _check_size(len(body), max_bytes)
+            return body
+        raise
+    with r:
+        if r.status_code == 304 and meta is not None:
+            _check_size(len(body), max_bytes)
+            _count("revalidated")
+            _refresh_meta(url, meta, r.headers)
+            return body
+        r.raise_for_status()
+        body = _read_body(r, max_bytes)
+
+    _count("downloads")
+    _count("bytes_fetched", len(body))
+    if use_cache:
+        _write_cached(url, body, r.headers)
+    return body
+
+
+def fetch_bytes(url, timeout=12, use_cache=True, max_bytes=None):
+    # Levanta exceção se falhar; pedidos simultâneos ao mesmo URL partilham o resultado
+    with _lock:
+        fut = _inflight.get(url)
+        owner = fut is None
+        if owner:
+            fut = Future()
+            _inflight[url] = fut
+        else:
+            _stats["deduplicated"] += 1
+    if not owner:
+        count_event("http_deduplicated")
+        body = fut.result()
+        _check_size(len(body), max_bytes)
+        return body
+
+    try:
+        fut.set_result(_fetch(url, timeout, use_cache, max_bytes))
+    except BaseException as e:
+        _count("errors")
+        fut.set_exception(e)
+    finally:
+        with _lock:
+            _inflight.pop(url, None)
+    return fut.result()
+
+
+def download_bytes(url, timeout=12, max_bytes=None):
+    # None se falhar; só o limite de tamanho passa como exceção
+    try:
+        return fetch_bytes(url, timeout=timeout, max_bytes=max_bytes)
+    except ResponseTooLarge:
+        raise
+    except Exception:
+        return None
+
+
+def http_stats():
+    with _lock:
+        return dict(_stats)
+
+
+def clear_http_cache():
+    try:
+        for name in os.listdir(HTTP_DIR):
+            os.remove(os.path.join(HTTP_DIR, name))
+    except OSError:
+        pass
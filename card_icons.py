@@ -0,0 +1,147 @@
+import hashlib
+import os
+from functools import lru_cache
+
+from PIL import Image, ImageDraw
+
+# --------------------
+# Ícones da linha de detalhes
+# --------------------
+# As fontes do card não têm emoji (saíam caixas vazias), por isso os ícones
+# são sprites próprios: formas vetoriais numa grelha 100×100, rasterizadas uma
+# vez por tamanho (com supersampling) numa máscara "L". A cor de destaque só
+# entra no paste, como nos carimbos de texto. Um PNG com o mesmo nome em
+# CARD_ICON_DIR substitui o sprite embutido (conta o canal alfa).
+
+ICON_DIR = os.environ.get("CARD_ICON_DIR", "")
+SUPERSAMPLE = 4
+ICON_CACHE_SIZE = 64
+
+# nome -> operações (forma, coordenadas na grelha[, raio]); "-forma" apaga
+ICON_SHAPES = {
+    "plane": (
+        ("rounded", (44, 4, 56, 92), 6),
+        ("polygon", ((50, 32), (96, 56), (96, 64), (50, 52), (4, 64), (4, 56))),
+        ("polygon", ((50, 76), (70, 88), (70, 94), (50, 88), (30, 94), (30, 88))),
+        ("rotate", -45),
+    ),
+    "hotel": (
+        ("rect", (6, 26, 15, 86)),
+        ("rect", (6, 62, 94, 74)),
+        ("rect", (85, 62, 94, 86)),
+        ("rounded", (19, 46, 37, 58), 5),
+        ("rounded", (40, 42, 94, 62), 6),
+    ),
+    "meal": (
+        ("rect", (18, 8, 22, 34)),
+        ("rect", (29, 8, 33, 34)),
+        ("rect", (40, 8, 44, 34)),
+        ("rounded", (18, 28, 44, 46), 8),
+        ("rounded", (27, 40, 35, 94), 4),
+        ("polygon", ((62, 54), (62, 16), (68, 6), (78, 6), (78, 54))),
+        ("rounded", (64, 50, 76, 94), 4),
+    ),
+    "baggage": (
+        ("rounded", (32, 12, 68, 36), 8),
+        ("-rect", (40, 20, 60, 36)),
+        ("rounded", (6, 28, 94, 88), 10),
+        ("-rect", (6, 52, 94, 57)),
+        ("rounded", (43, 46, 57, 63), 3),
+    ),
+    "transfer": (
+        ("rounded", (4, 20, 82, 76), 8),
+        ("polygon", ((70, 20), (82, 20), (96, 46), (96, 76), (70, 76))),
+        ("-rect", (12, 28, 32, 46)),
+        ("-rect", (38, 28, 58, 46)),
+        ("-polygon", ((64, 28), (80, 28), (88, 46), (64, 46))),
+        ("-ellipse", (12, 62, 40, 90)),
+        ("ellipse", (17, 67, 35, 85)),
+        ("-ellipse", (60, 62, 88, 90)),
+        ("ellipse", (65, 67, 83, 85)),
+    ),
+}
+
+
+def _rasterize(shapes, size):
+    side = size * SUPERSAMPLE
+    k = side / 100
+
+    def scale(coords):
+        if isinstance(coords[0], tuple):
+            return [(x * k, y * k) for x, y in coords]
+        return [v * k for v in coords]
+
+    img = Image.new("L", (side, side))
+    draw = ImageDraw.Draw(img)
+    for op, *args in shapes:
+        if op == "rotate":
+            img = img.rotate(args[0], Image.BICUBIC)
+            draw = ImageDraw.Draw(img)
+            continue
+        fill = 0 if op.startswith("-") else 255
+        kind, coords = op.lstrip("-"), scale(args[0])
+        if kind == "rect":
+            draw.rectangle(coords, fill=fill)
+        elif kind == "rounded":
+            draw.rounded_rectangle(coords, radius=args[1] * k, fill=fill)
+        elif kind == "polygon":
+            draw.polygon(coords, fill=fill)
+        elif kind == "ellipse":
+            draw.ellipse(coords, fill=fill)
+        else:
+            raise ValueError(f"Operação de ícone desconhecida: {op}")
+    return img.reduce(SUPERSAMPLE)
+
+
+def _from_png(path, size):
+    # Alfa do PNG (ou luminância, se não tiver), centrado numa caixa size×size
+    with Image.open(path) as src:
+        src.load()
+        mask = src.getchannel("A") if "A" in src.getbands() else src.convert("L")
+    mask.thumbnail((size, size), Image.LANCZOS)
+    out = Image.new("L", (size, size))
+    out.paste(mask, ((size - mask.width) // 2, (size - mask.height) // 2))
+    return out
+
+
+def icon_mask(name, size):
+    # Máscara "L" size×size do ícone, rasterizada uma vez por (ícone, tamanho,
+    # PNG de CARD_ICON_DIR): um PNG alterado volta a ser lido
+    return _icon_mask(name, max(1, int(size)), icon_set_digest())
+
+
+@lru_cache(maxsize=ICON_CACHE_SIZE)
+def _icon_mask(name, size, icons):
+    if icons is not None:
+        path = os.path.join(ICON_DIR, f"{name}.png")
+        if os.path.exists(path):
+            return _from_png(path, size)
+    if name not in ICON_SHAPES:
+        raise ValueError(f"Ícone desconhecido: {name}")
+    return _rasterize(ICON_SHAPES[name], size)
+
+
+def icon_set_digest():
+    # sha256 dos PNG que substituem sprites (entra na chave da cache de
+    # resultados); None se não houver substituições
+    if not ICON_DIR:
+        return None
+    found = []
+    for name in sorted(ICON_SHAPES):
+        try:
+            st = os.stat(os.path.join(ICON_DIR, f"{name}.png"))
+        except OSError:
+            continue
+        found.append((name, st.st_mtime_ns, st.st_size))
+    return _digest_overrides(tuple(found)) if found else None
+
+
+@lru_cache(maxsize=8)
+def _digest_overrides(found):
+    # found: (nome, mtime, tamanho) de cada PNG; um ficheiro alterado muda a chave
+    h = hashlib.sha256()
+    for name, _, _ in found:
+        h.update(name.encode("utf-8"))
+        with open(os.path.join(ICON_DIR, f"{name}.png"), "rb") as f:
+            h.update(hashlib.sha256(f.read()).digest())
+    return h.hexdigest()
@@ -0,0 +1,243 @@
+import re
+import threading
+from dataclasses import dataclass
+
+from card_fonts import FONT_URLS, font_bytes
+
+# --------------------
+# Layouts por formato
+# --------------------
+# Cada formato é descrito uma vez de forma declarativa (tamanhos de letra e
+# posições) e compilado num CardLayout imutável com uma caixa por bloco de texto.
+# O resultado fica em cache por formato e é reutilizado em todos os renders.
+# Um formato novo é só mais uma entrada em LAYOUT_SPECS; um tamanho livre
+# (ex: "1200×628" ou "1080x566") deriva do template com o aspeto mais próximo.
+# Com scale < 1 o mesmo layout é compilado em ponto pequeno (pré-visualização):
+# fontes e posições escalam juntas, por isso o resultado é o card final reduzido.
+# Cada bloco de texto tem uma TextBox (espaço até ao bloco seguinte): o tamanho
+# do template é o máximo e card_text.fit_text encolhe o texto até caber. Um
+# template em que um bloco não tenha espaço nem para o tamanho mínimo é um erro.
+
+# fonte: (peso, tamanho) | ícones e posições em píxeis no tamanho do formato
+LAYOUT_SPECS = {
+    "Feed 1080×1350": {
+        "size": (1080, 1350),
+        "fonts": {
+            "top": ("regular", 50), "sub": ("regular", 85), "dest": ("bold", 800),
+            "plab": ("semibold", 65), "price": ("bold", 600), "pby": ("regular", 55),
+            "icon": ("semibold", 55), "foot": ("regular", 45),
+        },
+        "icon_size": 80,
+        "subtitle_y": 240, "dest_y": 400, "price_top": 700, "icons_y": 1120, "footer_y": 1290,
+    },
+    "Quadrado 1080×1080": {
+        "size": (1080, 1080),
+        "fonts": {
+            "top": ("regular", 48), "sub": ("regular", 80), "dest": ("bold", 750),
+            "plab": ("semibold", 62), "price": ("bold", 550), "pby": ("regular", 52),
+            "icon": ("semibold", 50), "foot": ("regular", 40),
+        },
+        "icon_size": 74,
+        "subtitle_y": 170, "dest_y": 300, "price_top": 530, "icons_y": 920, "footer_y": 1020,
+    },
+    "Wide 1920×1080": {
+        "size": (1920, 1080),
+        "fonts": {
+            "top": ("regular", 56), "sub": ("regular", 92), "dest": ("bold", 900),
+            "plab": ("semibold", 72), "price": ("bold", 700), "pby": ("regular", 62),
+            "icon": ("semibold", 58), "foot": ("regular", 48),
+        },
+        "icon_size": 86,
+        "subtitle_y": 170, "dest_y": 300, "price_top": 530, "icons_y": 920, "footer_y": 1020,
+    },
+    "Story 1080×1920": {
+        "size": (1080, 1920),
+        "fonts": {
+            "top": ("regular", 60), "sub": ("regular", 98), "dest": ("bold", 1000),
+            "plab": ("semibold", 78), "price": ("bold", 750), "pby": ("regular", 68),
+            "icon": ("semibold", 62), "foot": ("regular", 52),
+        },
+        "icon_size": 90,
+        "subtitle_y": 340, "dest_y": 550, "price_top": 1080, "icons_y": 1600, "footer_y": 1850,
+    },
+}
+
+# Medidas comuns a todos os templates (no tamanho do template)
+TOP_Y = 50
+TOP_GAP = 50
+PRICE_GAP = 60
+PRICE_BY_GAP = 15
+ICON_OFFSET = 100
+ICON_COUNT = 5
+ICON_LINE_SPACING = 4
+# Caixas dos blocos de texto: margem lateral e folga até ao bloco seguinte
+TEXT_WIDTH = 0.92
+TEXT_MARGIN = 20
+MIN_TEXT_SIZE = 24
+
+FORMATS = {name: spec["size"] for name, spec in LAYOUT_SPECS.items()}
+
+_CUSTOM_RE = re.compile(r"(\d+)\s*[x×]\s*(\d+)\s*$", re.IGNORECASE)
+
+
+@dataclass(frozen=True, slots=True)
+class TextBox:
+    # Caixa de um bloco de texto: a fonte encolhe (e o texto quebra) até caber
+    font: str      # URL da fonte
+    max_size: int  # tamanho do template
+    width: int
+    height: int
+    max_lines: int = 1
+    min_size: int = 1
+
+
+@dataclass(frozen=True, slots=True, eq=False)
+class CardLayout:
+    name: str
+    width: int
+    height: int
+    center_x: int
+    top_y: int
+    top_gap: int
+    subtitle_y: int
+    dest_y: int
+    price_cx: int
+    price_top: int
+    price_gap: int
+    price_by_gap: int
+    icons_y: int
+    icon_offset: int
+    icon_size: int
+    icon_xs: tuple
+    icon_spacing: int
+    footer_y: int
+    b_top: TextBox
+    b_sub: TextBox
+    b_dest: TextBox
+    b_plab: TextBox
+    b_price: TextBox
+    b_pby: TextBox
+    b_icon: TextBox
+    b_foot: TextBox
+
+
+_lock = threading.Lock()
+_layouts = {}
+
+
+def format_size(fmt):
+    if fmt in FORMATS:
+        return FORMATS[fmt]
+    m = _CUSTOM_RE.search(fmt or "")
+    if m:
+        return int(m.group(1)), int(m.group(2))
+    raise ValueError(f"Formato desconhecido: {fmt}")
+
+
+def resolve_formats(names):
+    # Aceita o nome completo ("Story 1080×1920"), só a primeira palavra ("Story")
+    # ou um tamanho livre ("1200x628")
+    if not names:
+        return list(FORMATS)
+    out = []
+    for name in names:
+        matches = [f for f in FORMATS if f == name or f.split()[0].lower() == name.lower()]
+        if not matches:
+            try:
+                format_size(name)
+            except ValueError:
+                raise ValueError(f"Formato desconhecido: {name} (disponíveis: {', '.join(FORMATS)} ou LxA)")
+            matches = [name]
+        out.extend(m for m in matches if m not in out)
+    return out
+
+
+def _base_spec(width, height):
+    # Template com o aspeto mais próximo do tamanho pedido
+    ratio = width / height
+    return min(LAYOUT_SPECS.values(), key=lambda s: abs(s["size"][0] / s["size"][1] - ratio))
+
+
+def _compile(fmt, scale=1.0):
+    width, height = format_size(fmt)
+    spec = LAYOUT_SPECS.get(fmt) or _base_spec(width, height)
+    if scale != 1.0:
+        width, height = max(1, round(width * scale)), max(1, round(height * scale))
+    base_w, base_h = spec["size"]
+    sx, sy = width / base_w, height / base_h
+    sf = min(sx, sy)
+
+    spacing = width // ICON_COUNT
+
+    # Caixas no tamanho do template: cada bloco vai até ao seguinte
+    icon_top = spec["icons_y"] - ICON_OFFSET
+    price_y = spec["price_top"] + PRICE_GAP
+    _, pby_size = spec["fonts"]["pby"]
+    heights = {
+        "top": (TOP_GAP, 1),
+        "sub": (spec["dest_y"] - spec["subtitle_y"] - TEXT_MARGIN, 3),
+        "dest": (spec["price_top"] - spec["dest_y"] - TEXT_MARGIN, 2),
+        "plab": (PRICE_GAP, 1),
+        "price": (icon_top - price_y - PRICE_BY_GAP - pby_size - TEXT_MARGIN, 1),
+        "pby": (pby_size, 1),
+        "icon": (spec["footer_y"] - spec["icons_y"] - TEXT_MARGIN, 4),
+        "foot": (base_h - spec["footer_y"], 1),
+    }
+    column = base_w / 2  # coluna do preço, centrada a 3/4 da largura
+    widths = {"plab": column, "price": column, "pby": column, "icon": base_w / ICON_COUNT}
+    min_size = max(1, round(MIN_TEXT_SIZE * sf))
+    boxes = {}
+    for key, (h, lines) in heights.items():
+        weight, size = spec["fonts"][key]
+        box_h = round(h * sy)
+        if box_h < min_size:
+            raise ValueError(f"Layout {fmt}: a caixa '{key}' tem {box_h}px de altura, "
+                             f"menos do que o tamanho mínimo ({min_size}px)")
+        boxes[f"b_{key}"] = TextBox(
+            font=FONT_URLS[weight],
+            max_size=max(1, round(size * sf)),
+            width=max(1, round(widths.get(key, base_w) * TEXT_WIDTH * sx)),
+            height=box_h,
+            max_lines=lines,
+            min_size=min_size,
+        )
+    return CardLayout(
+        name=fmt,
+        width=width,
+        height=height,
+        center_x=width // 2,
+        top_y=round(TOP_Y * sy),
+        top_gap=round(TOP_GAP * sy),
+        subtitle_y=round(spec["subtitle_y"] * sy),
+        dest_y=round(spec["dest_y"] * sy),
+        price_cx=int(width * 0.75),
+        price_top=round(spec["price_top"] * sy),
+        price_gap=round(PRICE_GAP * sy),
+        price_by_gap=round(PRICE_BY_GAP * sy),
+        icons_y=round(spec["icons_y"] * sy),
+        icon_offset=round(ICON_OFFSET * sy),
+        icon_size=max(1, round(spec["icon_size"] * sf)),
+        icon_xs=tuple(spacing * i + spacing // 2 for i in range(ICON_COUNT)),
+        icon_spacing=max(1, round(ICON_LINE_SPACING * sf)),
+        footer_y=round(spec["footer_y"] * sy),
+        **boxes,
+    )
+
+
+def get_layout(fmt, scale=1.0):
+    key = (fmt, scale)
+    layout = _layouts.get(key)
+    if layout is not None:
+        return layout
+    layout = _compile(fmt, scale)
+    # Só guarda layouts com as fontes verdadeiras: sem elas o texto não é
+    # ajustado e o chrome (em cache por layout) sairia com a fonte por defeito
+    if all(font_bytes(url) is not None for url in FONT_URLS.values()):
+        with _lock:
+            _layouts[key] = layout
+    return layout
+
+
+def clear_layout_cache():
+    with _lock:
+        _layouts.clear()
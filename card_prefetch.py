@@ -0,0 +1,71 @@
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+import requests
+
+from card_fonts import FONT_URLS, local_font_bytes, remember_font_bytes
+from card_http import ResponseTooLarge, fetch_bytes
+
+# --------------------
+# Pré-carregamento de recursos remotos
+# --------------------
+# Descarrega em paralelo (threads) todos os URLs únicos de um lote, com limite
+# de concorrência, timeout e novas tentativas, e entrega cada resultado assim
+# que chega. Assim a latência da rede sobrepõe-se ao trabalho de CPU.
+
+
+def is_url(source):
+    return isinstance(source, str) and source.startswith(("http://", "https://"))
+
+
+def fetch_with_retries(url, timeout=15, retries=2, backoff=0.5, use_cache=True, max_bytes=None):
+    for attempt in range(retries + 1):
+        try:
+            return fetch_bytes(url, timeout=timeout, use_cache=use_cache, max_bytes=max_bytes)
+        except Exception as e:
+            # 4xx (ou uma resposta acima do limite) não melhora com nova tentativa
+            client_error = isinstance(e, ResponseTooLarge) or (
+                isinstance(e, requests.HTTPError) and e.response is not None
+                and e.response.status_code < 500)
+            if attempt == retries or client_error:
+                raise
+            time.sleep(backoff * 2 ** attempt)
+
+
+def prefetch(urls, concurrency=8, timeout=15, retries=2, backoff=0.5, use_cache=True, max_bytes=None):
+    # Gerador: (url, bytes, erro) pela ordem em que os downloads terminam. Só
+    # há concurrency downloads em curso ou por entregar: quem consome mais
+    # devagar (ex: um pool de render cheio) trava os downloads seguintes
+    urls = iter(dict.fromkeys(u for u in urls if u))
+    with ThreadPoolExecutor(max_workers=max(1, concurrency)) as pool:
+        pending = {}
+
+        def fill():
+            for url in urls:
+                pending[pool.submit(fetch_with_retries, url, timeout, retries, backoff, use_cache, max_bytes)] = url
+                if len(pending) >= max(1, concurrency):
+                    return
+
+        fill()
+        while pending:
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for fut in done:
+                url = pending.pop(fut)
+                try:
+                    yield url, fut.result(), None
+                except Exception as e:
+                    yield url, None, f"{type(e).__name__}: {e}"
+            fill()
+
+
+def prefetch_fonts(concurrency=8, timeout=15, retries=2):
+    # Deixa as fontes na cache em disco, para os workers as lerem sem rede;
+    # as que já lá estão não voltam a ser pedidas
+    errors = {}
+    missing = [url for url in FONT_URLS.values() if local_font_bytes(url) is None]
+    for url, data, error in prefetch(missing, concurrency, timeout, retries, use_cache=False):
+        if data is not None:
+            remember_font_bytes(url, data)
+        else:
+            errors[url] = error
+    return errors
@@ -0,0 +1,165 @@
+import argparse
+import contextvars
+import cProfile
+import io
+import json
+import pstats
+import sys
+import time
+import tracemalloc
+from contextlib import contextmanager
+
+# --------------------
+# Tempos por etapa do render
+# --------------------
+# Os módulos do render marcam as etapas com `with stage("cover_resize"):` e
+# contam eventos com count("http_bytes_fetched", n). Fora de collect_timings() isto
+# não faz nada; dentro, fica tudo registado num RenderTimings (por contexto,
+# por isso threads e processos diferentes não se misturam).
+
+_current = contextvars.ContextVar("card_render_timings", default=None)
+
+
+class RenderTimings:
+    def __init__(self):
+        self.stages = {}       # etapa -> segundos (somados)
+        self.calls = {}        # etapa -> número de vezes
+        self.alloc_peak = {}   # etapa -> pico de memória alocada (só com tracemalloc)
+        self.counters = {}
+        self.total = 0.0
+
+    def add(self, name, seconds):
+        self.stages[name] = self.stages.get(name, 0.0) + seconds
+        self.calls[name] = self.calls.get(name, 0) + 1
+
+    def count(self, name, n=1):
+        self.counters[name] = self.counters.get(name, 0) + n
+
+    def as_dict(self):
+        out = {
+            "total_ms": round(self.total * 1000, 2),
+            "stages_ms": {k: round(v * 1000, 2) for k, v in self.stages.items()},
+            "calls": dict(self.calls),
+            "counters": dict(self.counters),
+        }
+        if self.alloc_peak:
+            out["alloc_peak_bytes"] = dict(self.alloc_peak)
+        return out
+
+
+def current():
+    return _current.get()
+
+
+def count(name, n=1):
+    t = _current.get()
+    if t is not None:
+        t.count(name, n)
+
+
+@contextmanager
+def stage(name):
+    t = _current.get()
+    if t is None:
+        yield
+        return
+    tracing = tracemalloc.is_tracing()
+    if tracing:
+        base = tracemalloc.get_traced_memory()[0]
+        tracemalloc.reset_peak()
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        t.add(name, time.perf_counter() - start)
+        if tracing:
+            peak = tracemalloc.get_traced_memory()[1] - base
+            t.alloc_peak[name] = max(t.alloc_peak.get(name, 0), peak)
+
+
+@contextmanager
+def collect_timings():
+    t = RenderTimings()
+    token = _current.set(t)
+    start = time.perf_counter()
+    try:
+        yield t
+    finally:
+        t.total = time.perf_counter() - start
+        _current.reset(token)
+
+
+def timed_call(fn, *args, **kwargs):
+    # (resultado, tempos em dict): serve para medir num processo e reportar noutro
+    with collect_timings() as timings:
+        result = fn(*args, **kwargs)
+    return result, timings.as_dict()
+
+
+def profile_call(fn, *args, top=25, **kwargs):
+    # cProfile + tracemalloc para uma única chamada (ex: um render)
+    was_tracing = tracemalloc.is_tracing()
+    if not was_tracing:
+        tracemalloc.start()
+    profiler = cProfile.Profile()
+    with collect_timings() as timings:
+        profiler.enable()
+        try:
+            result = fn(*args, **kwargs)
+        finally:
+            profiler.disable()
+    snapshot = tracemalloc.take_snapshot()
+    _, peak = tracemalloc.get_traced_memory()
+    if not was_tracing:
+        tracemalloc.stop()
+
+    text = io.StringIO()
+    pstats.Stats(profiler, stream=text).sort_stats("cumulative").print_stats(top)
+    allocations = [
+        {"where": str(s.traceback[0]), "size_bytes": s.size, "count": s.count}
+        for s in snapshot.statistics("lineno")[:top]
+    ]
+    report = {
+        "timings": timings.as_dict(),
+        "tracemalloc": {"peak_bytes": peak, "top": allocations},
+        "cprofile": text.getvalue(),
+    }
+    return result, report
+
+
+def main(argv=None):
+    from card_render import CardSpec, DEFAULT_FORMAT, encode_card, render_card
+
+    parser = argparse.ArgumentParser(description="Perfil (cProfile + tracemalloc) de um único render.")
+    parser.add_argument("--image", help="imagem de fundo (caminho ou URL); por defeito a do template")
+    parser.add_argument("--format", default=DEFAULT_FORMAT, help="formato do card")
+    parser.add_argument("--top", type=int, default=25, help="linhas do cProfile / tracemalloc")
+    parser.add_argument("--json", action="store_true", help="imprime o relatório em JSON")
+    args = parser.parse_args(argv)
+
+    spec = CardSpec(fmt=args.format)
+    if args.image:
+        spec.image_source = args.image
+
+    def render():
+        return encode_card(render_card(spec))
+
+    _, report = profile_call(render, top=args.top)
+    if args.json:
+        json.dump(report, sys.stdout, indent=2)
+        print()
+        return 0
+
+    print(report["cprofile"])
+    print("Etapas (ms):")
+    for name, ms in report["timings"]["stages_ms"].items():
+        print(f"  {name:<16} {ms:>10.2f}")
+    print(f"Pico de memória: {report['tracemalloc']['peak_bytes'] / 1e6:.1f} MB")
+    return 0
+
+
+if __name__ == "__main__":
+    # Corre através do módulo importado (não de __main__) para que o render e
+    # o perfil partilhem o mesmo ContextVar
+    import card_profile
+    sys.exit(card_profile.main())
@@ -0,0 +1,557 @@
+from dataclasses import dataclass, fields, replace
+from functools import lru_cache
+from io import BytesIO
+import math
+import os
+import re
+import unicodedata
+import zipfile
+
+from PIL import Image, ImageChops, ImageDraw, ExifTags
+
+from card_http import ResponseTooLarge, download_bytes
+from card_icons import icon_mask, icon_set_digest
+from card_layout import FORMATS, format_size, get_layout
+from card_profile import count, stage
+from card_text import fit_text, place_stamp, stamp_text, text_bounds, text_extent
+
+# --------------------
+# Motor de renderização (sem Streamlit)
+# --------------------
+# Pode ser importado por workers, CLIs e benchmarks: recebe um CardSpec e
+# devolve a imagem final (PIL) ou os bytes já codificados.
+
+DEFAULT_FORMAT = "Feed 1080×1350"
+DEFAULT_IMAGE_URL = "https://images.unsplash.com/photo-1512453979798-5ea266f8880c?q=80&w=1400&auto=format&fit=crop"
+
+# Qualidade do redimensionamento do fundo: (filtro, reducing_gap)
+# fast para pré-visualizações, best para o ficheiro final
+QUALITY = {
+    "fast": (Image.BILINEAR, 2.0),
+    "balanced": (Image.LANCZOS, 3.0),
+    "best": (Image.LANCZOS, None),
+}
+
+# Mudar sempre que o desenho do card mudar: invalida a cache de resultados
+RENDERER_VERSION = 6
+
+# Orçamento de um fundo, verificado pelo cabeçalho antes de descodificar
+MAX_BACKGROUND_PIXELS = int(os.environ.get("CARD_MAX_BACKGROUND_PIXELS", str(100_000_000)))
+MAX_BACKGROUND_BYTES = int(os.environ.get("CARD_MAX_BACKGROUND_BYTES", str(50 * 1024 * 1024)))
+# Fundos sem draft (PNG, WEBP...) são reduzidos logo após a descodificação,
+# mas ficam pelo menos este múltiplo do alvo para o filtro final
+PRE_REDUCE_GAP = 2
+
+# Escurecimento do fundo: alfa do preto por cima da foto (0-255)
+OVERLAY_ALPHA = 90
+# "flat": uniforme; "gradient": mais escuro em baixo; "vignette": mais escuro nos cantos
+OVERLAYS = ("flat", "gradient", "vignette")
+
+# Formatos de ficheiro: (mime, extensão)
+IMAGE_FORMATS = {
+    "PNG": ("image/png", "png"),
+    "JPEG": ("image/jpeg", "jpg"),
+    "WEBP": ("image/webp", "webp"),
+}
+PREVIEW_WIDTH = 720
+# Escala da pré-visualização ao vivo (fontes e posições escalam com o layout)
+PREVIEW_SCALE = 0.33
+
+TOP_LINES = ("CONSULTOR INDEPENDENTE RNAVT3301", "iCliGo travel consultant")
+FOOTER_TEXT = "VALOR BASEADO EM 2 ADULTOS. PREÇOS SUJEITOS A ALTERAÇÕES."
+
+# Dados de cada viagem: os valores por defeito do CardSpec são o exemplo de
+# Nápoles, que num lote ou pedido nunca devem aparecer no lugar de um campo em falta
+TRIP_FIELDS = ("subtitle", "destination", "price", "origin", "dates", "hotel", "meal",
+               "baggage", "transfer", "image_source")
+
+
+@dataclass
+class CardSpec:
+    subtitle: str = "Entre o sabor da pizza e a vista do Vesúvio – Nápoles encanta"
+    destination: str = "NÁPOLES"
+    price: str = "409€"
+    price_label: str = "DESDE"
+    price_by: str = "POR PESSOA"
+    origin: str = "Porto"
+    dates: str = "7 a 15 Março"
+    hotel: str = "Hotel Herculaneum"
+    meal: str = "Pequeno Almoço"
+    baggage: str = "Bagagem de mão"
+    transfer: str = "Transfer In + Out"
+    accent_color: str = "#00ffae"
+    fmt: str = DEFAULT_FORMAT
+    image_source: str = DEFAULT_IMAGE_URL
+    overlay: str = "flat"
+
+    @classmethod
+    def from_dict(cls, data):
+        # Ignora chaves desconhecidas. Campos da viagem em falta ou vazios (ex:
+        # colunas de um CSV) ficam vazios; os restantes (cor, formato, rótulos)
+        # ficam com o valor do template
+        names = {f.name for f in fields(cls)}
+        values = dict.fromkeys(TRIP_FIELDS, "")
+        values.update({k: v for k, v in data.items() if k in names and v not in (None, "")})
+        return cls(**values)
+
+    @property
+    def size(self):
+        return format_size(self.fmt)
+
+    @property
+    def accent_rgb(self):
+        return hex_to_rgb(self.accent_color)
+
+
+# --------------------
+# Helpers
+# --------------------
+def hex_to_rgb(color):
+    return tuple(int(color.lstrip("#")[i:i+2], 16) for i in (0, 2, 4))
+
+def draw_centered(img, text, font, x_center, y, fill=(255, 255, 255), align="left", spacing=4):
+    # Carimba o texto centrado em x_center (máscaras e medidas vêm da cache de card_text)
+    w, h = text_extent(text, font, align, spacing)
+    stamp_text(img, (x_center - w / 2, y), text, font, fill, align, spacing)
+    return w, h
+
+# Orientação EXIF (1-8) -> transposição que a endireita
+EXIF_TRANSPOSE = {
+    2: Image.Transpose.FLIP_LEFT_RIGHT,
+    3: Image.Transpose.ROTATE_180,
+    4: Image.Transpose.FLIP_TOP_BOTTOM,
+    5: Image.Transpose.TRANSPOSE,
+    6: Image.Transpose.ROTATE_270,
+    7: Image.Transpose.TRANSVERSE,
+    8: Image.Transpose.ROTATE_90,
+}
+
+
+def exif_orientation(img: Image.Image) -> int:
+    # Lê só a etiqueta do cabeçalho (não descodifica píxeis)
+    try:
+        return int(img.getexif().get(ExifTags.Base.Orientation, 1))
+    except Exception:
+        return 1
+
+
+def swaps_axes(orientation) -> bool:
+    return orientation in (5, 6, 7, 8)
+
+
+def fix_exif_orientation(img: Image.Image, orientation=None) -> Image.Image:
+    # As 8 orientações num só transpose (sem reamostragem)
+    if orientation is None:
+        orientation = exif_orientation(img)
+    method = EXIF_TRANSPOSE.get(orientation)
+    return img if method is None else img.transpose(method)
+
+def cover_resize(img: Image.Image, target_w: int, target_h: int, quality="balanced") -> Image.Image:
+    # Recorta primeiro ao aspeto do alvo (box) e só depois reamostra; com
+    # reducing_gap o Pillow faz um reduce() inteiro barato antes do filtro
+    resample, reducing_gap = QUALITY[quality]
+    ratio_img = img.width / img.height
+    ratio_tar = target_w / target_h
+    if ratio_img > ratio_tar:
+        crop_h = img.height
+        crop_w = crop_h * ratio_tar
+    else:
+        crop_w = img.width
+        crop_h = crop_w / ratio_tar
+    left = (img.width - crop_w) / 2
+    top = (img.height - crop_h) / 2
+    box = (left, top, left + crop_w, top + crop_h)
+    return img.resize((target_w, target_h), resample, box=box, reducing_gap=reducing_gap)
+
+@lru_cache(maxsize=32)
+def overlay_mask(kind, size, alpha=OVERLAY_ALPHA):
+    # Máscara "L" do escurecimento, calculada uma vez por (modo, tamanho)
+    w, h = size
+    if kind == "gradient":
+        # Vertical: alpha/2 no topo até 2*alpha em baixo (zona do preço e ícones)
+        ramp = Image.linear_gradient("L").resize((w, h), Image.BILINEAR)
+        lo, hi = alpha // 2, min(255, alpha * 2)
+    elif kind == "vignette":
+        # Radial: alpha/2 no centro até 2*alpha nos cantos
+        ramp = Image.radial_gradient("L").resize((w, h), Image.BILINEAR)
+        lo, hi = alpha // 2, min(255, alpha * 2)
+    else:
+        raise ValueError(f"Overlay desconhecido: {kind}")
+    return ramp.point([lo + (hi - lo) * i // 255 for i in range(256)])
+
+
+def darken(img: Image.Image, kind="flat", alpha=OVERLAY_ALPHA) -> Image.Image:
+    # Escurece a imagem RGB no próprio buffer (sem overlay RGBA nem cópias)
+    if kind == "flat":
+        ImageDraw.Draw(img, "RGBA").rectangle((0, 0, img.width, img.height), fill=(0, 0, 0, alpha))
+    else:
+        img.paste((0, 0, 0), (0, 0), overlay_mask(kind, img.size, alpha))
+    return img
+
+
+def apply_draft(img: Image.Image, target_size, orientation=None) -> Image.Image:
+    # JPEG: descodifica logo a 1/2, 1/4 ou 1/8 da resolução, desde que a
+    # imagem continue a cobrir o alvo (tendo em conta a rotação EXIF)
+    if img.format != "JPEG" or not target_size:
+        return img
+    if orientation is None:
+        orientation = exif_orientation(img)
+    w, h = target_size
+    if swaps_axes(orientation):
+        w, h = h, w
+    img.draft("RGB", (w, h))
+    return img
+
+def cover_target(sizes):
+    # Tamanho mínimo que cobre todos os formatos pedidos
+    return max(w for w, _ in sizes), max(h for _, h in sizes)
+
+class BackgroundTooLarge(RuntimeError):
+    pass
+
+
+def _buffer_bytes(img):
+    # O Pillow guarda 1 byte por píxel em L/P/1 e 4 nos restantes modos
+    return img.width * img.height * (1 if img.mode in ("1", "L", "P") else 4)
+
+
+def _source_bytes(source):
+    if isinstance(source, (bytes, bytearray)):
+        return len(source)
+    try:
+        if hasattr(source, "seek"):
+            pos = source.tell()
+            size = source.seek(0, os.SEEK_END)
+            source.seek(pos)
+            return size
+        return os.path.getsize(source)
+    except (OSError, TypeError, ValueError):
+        return None
+
+
+def check_budget(img, nbytes=None):
+    # Só lê o cabeçalho: Image.open ainda não descodificou nada
+    if nbytes is not None and nbytes > MAX_BACKGROUND_BYTES:
+        raise BackgroundTooLarge(f"Imagem demasiado grande: {nbytes / 1e6:.0f} MB "
+                                 f"(máximo {MAX_BACKGROUND_BYTES / 1e6:.0f} MB)")
+    if img.width * img.height > MAX_BACKGROUND_PIXELS:
+        raise BackgroundTooLarge(f"Imagem demasiado grande: {img.width}x{img.height} "
+                                 f"(máximo {MAX_BACKGROUND_PIXELS / 1e6:.0f} MP)")
+
+
+def download_background(url, timeout=15):
+    # O limite de bytes vale durante a transferência: um fundo grande demais
+    # é abortado a meio, sem ficar em memória nem na cache HTTP
+    with stage("download"):
+        try:
+            data = download_bytes(url, timeout=timeout, max_bytes=MAX_BACKGROUND_BYTES)
+        except ResponseTooLarge as e:
+            raise BackgroundTooLarge(str(e)) from e
+    if not data:
+        raise RuntimeError("Falha ao fazer download da imagem.")
+    return data
+
+
+def open_checked(fp, nbytes=None) -> Image.Image:
+    try:
+        img = Image.open(fp)
+    except Image.DecompressionBombError as e:
+        raise BackgroundTooLarge(str(e)) from e
+    check_budget(img, nbytes)
+    return img
+
+
+def pre_reduce(img: Image.Image, target_size, orientation=1):
+    # Redução inteira (reduce) logo após descodificar, para formatos sem draft
+    if not target_size:
+        return img
+    w, h = target_size
+    if swaps_axes(orientation):
+        w, h = h, w
+    factor = int(min(img.width / w, img.height / h) // PRE_REDUCE_GAP)
+    if factor < 2:
+        return img
+    if img.mode not in ("L", "RGB", "RGBA"):
+        img = img.convert("RGBA" if "A" in img.getbands() or "transparency" in img.info else "RGB")
+    return img.reduce(factor)
+
+
+def load_background(source, timeout=15, target_size=None) -> Image.Image:
+    # Aceita uma imagem PIL, bytes, um ficheiro (upload), um caminho ou um URL.
+    # Confirma o orçamento pelo cabeçalho, descodifica já reduzido (draft do
+    # JPEG, reduce nos outros) e devolve RGB. Os contadores bg_* do perfil
+    # registam os píxeis da origem e o pico estimado dos buffers desta carga.
+    if isinstance(source, Image.Image):
+        if source.mode == "RGB" and source.format is None:
+            # Já passou por aqui (ex: cache das apps): usa-se tal como está, sem cópia
+            return source
+        img = source
+    elif isinstance(source, (bytes, bytearray)):
+        img = open_checked(BytesIO(source), len(source))
+    elif hasattr(source, "read"):
+        img = open_checked(source, _source_bytes(source))
+    elif isinstance(source, str) and source.startswith(("http://", "https://")):
+        data = download_background(source, timeout)
+        img = open_checked(BytesIO(data), len(data))
+    elif isinstance(source, str) and source:
+        img = open_checked(source, _source_bytes(source))
+    else:
+        raise RuntimeError("Nenhuma imagem de fundo indicada.")
+
+    count("bg_source_pixels", img.width * img.height)
+    orientation = exif_orientation(img)
+    peak = 0
+    with stage("decode"):
+        apply_draft(img, target_size, orientation)
+        img.load()
+        live = _buffer_bytes(img)
+        reduced = pre_reduce(img, target_size, orientation)
+        if reduced is not img:
+            peak = live + _buffer_bytes(reduced)
+            img = reduced
+        live = _buffer_bytes(img)
+    # Orientação depois das reduções: o transpose corre sobre a imagem pequena
+    with stage("exif"):
+        oriented = fix_exif_orientation(img, orientation)
+        if oriented is not img:
+            peak = max(peak, live + _buffer_bytes(oriented))
+            img = oriented
+    with stage("convert"):
+        if img.mode != "RGB":
+            converted = img.convert("RGB")
+            peak = max(peak, _buffer_bytes(img) + _buffer_bytes(converted))
+            img = converted
+    count("bg_decoded_pixels", img.width * img.height)
+    count("bg_peak_bytes", max(peak, _buffer_bytes(img)))
+    return img
+
+
+def shared_intermediate(img: Image.Image, sizes, quality="balanced") -> Image.Image:
+    # Menor versão da imagem que ainda cobre todos os tamanhos pedidos, para
+    # que cada formato faça o seu cover_resize a partir de uma imagem pequena
+    scale = max(max(w / img.width, h / img.height) for w, h in sizes)
+    if scale >= 1:
+        return img
+    resample, reducing_gap = QUALITY[quality]
+    new_w = min(img.width, math.ceil(img.width * scale))
+    new_h = min(img.height, math.ceil(img.height * scale))
+    with stage("intermediate"):
+        return img.resize((new_w, new_h), resample, reducing_gap=reducing_gap)
+
+def slugify(text):
+    text = unicodedata.normalize("NFKD", text).encode("ascii", "ignore").decode("ascii")
+    return re.sub(r"[^a-z0-9]+", "-", text.lower()).strip("-") or "card"
+
+
+# --------------------
+# Render
+# --------------------
+def scaled_size(size, scale=1.0):
+    w, h = size
+    if scale == 1.0:
+        return w, h
+    return max(1, round(w * scale)), max(1, round(h * scale))
+
+
+def render_card(spec: CardSpec, background=None, quality="balanced", scale=1.0) -> Image.Image:
+    # scale < 1: o mesmo card em ponto pequeno (pré-visualização ao vivo)
+    if background is None:
+        background = spec.image_source
+    bg = load_background(background, target_size=scaled_size(spec.size, scale))
+    return compose_card(spec, bg, quality, scale)
+
+
+def decode_plan(formats, scale=1.0):
+    # (alvo da descodificação, fundo intermédio partilhado?): o que os outros
+    # formatos pedidos na mesma chamada mudam nos píxeis de cada card
+    sizes = [scaled_size(format_size(f), scale) for f in formats]
+    return cover_target(sizes), len(sizes) > 1
+
+
+def render_card_formats(spec: CardSpec, formats=None, background=None, quality="balanced", scale=1.0,
+                        plan=None) -> dict:
+    # Descodifica e orienta o fundo uma única vez e desenha todos os formatos.
+    # plan: o decode_plan de um conjunto maior (ex: os formatos que faltam na
+    # cache de resultados, desenhados como no pedido completo)
+    formats = list(formats or FORMATS)
+    target, shared = plan or decode_plan(formats, scale)
+    if background is None:
+        background = spec.image_source
+    bg = load_background(background, target_size=target)
+    if shared:
+        bg = shared_intermediate(bg, [target], quality)
+    return {fmt: compose_card(replace(spec, fmt=fmt), bg, quality, scale) for fmt in formats}
+
+
+def render_previews(spec: CardSpec, formats=None, background=None, scale=PREVIEW_SCALE) -> dict:
+    # Pré-visualizações já codificadas ({formato: JPEG}), prontas a mostrar
+    cards = render_card_formats(spec, formats, background, quality="fast", scale=scale)
+    return {fmt: encode_preview(card) for fmt, card in cards.items()}
+
+
+def compose_card(spec: CardSpec, bg: Image.Image, quality="balanced", scale=1.0) -> Image.Image:
+    # Desenha o card sobre um fundo já carregado (RGB, orientado)
+    with stage("layout"):
+        L = get_layout(spec.fmt, scale)
+    W, H = L.width, L.height
+
+    # Ajustar imagem (cover): o resultado é um buffer novo e serve de tela
+    with stage("cover_resize"):
+        canvas = cover_resize(bg, W, H, quality)
+
+    # Escurecer no próprio buffer
+    with stage("darken"):
+        darken(canvas, spec.overlay)
+
+    # Partes fixas (cabeçalho, ícones, rodapé): camada pronta, colada por faixas
+    with stage("chrome"):
+        for rgb, alpha, corner in chrome_layer(L, spec.accent_rgb, icon_set_digest()):
+            canvas.paste(rgb, corner, alpha)
+
+    with stage("text"):
+        draw_text(canvas, spec, L)
+    return canvas
+
+
+# Sprites da linha de detalhes (card_icons), pela ordem dos detalhes
+ICONS = ("plane", "hotel", "meal", "baggage", "transfer")
+
+
+def chrome_items(L, accent_rgb):
+    # Partes iguais em todos os cards do mesmo formato e cor: (máscara, canto, cor)
+    white = (255, 255, 255)
+
+    def centered(text, font, x_center, y):
+        w, _ = text_extent(text, font)
+        return place_stamp((x_center - w / 2, y), text, font)
+
+    for i, line in enumerate(TOP_LINES):
+        f_top, line = fit_text(line, L.b_top)
+        yield centered(line, f_top, L.center_x, L.top_y + i * L.top_gap) + (white,)
+    for xc, name in zip(L.icon_xs, ICONS):
+        yield icon_mask(name, L.icon_size), (xc - L.icon_size // 2, L.icons_y - L.icon_offset), accent_rgb
+    f_foot, footer = fit_text(FOOTER_TEXT, L.b_foot)
+    yield centered(footer, f_foot, L.center_x, L.footer_y) + (white,)
+
+
+CHROME_BAND_GAP = 32
+
+
+@lru_cache(maxsize=64)
+def chrome_layer(L, accent_rgb, icons=None):
+    # Camada transparente por (layout, cor de destaque), guardada só nas faixas
+    # horizontais com conteúdo: ((cor, alfa, canto), ...). A cor é sólida e o
+    # alfa é a máscara do texto ou do ícone, para que o paste dê o mesmo
+    # resultado que carimbar cada um no card. icons (icon_set_digest) só entra
+    # na chave da cache: um PNG de CARD_ICON_DIR alterado gera outra camada.
+    rgb = Image.new("RGB", (L.width, L.height))
+    alpha = Image.new("L", (L.width, L.height))
+    for mask, (x, y), fill in chrome_items(L, accent_rgb):
+        rgb.paste(fill, (x, y), mask.point([0] + [255] * 255))
+        box = (x, y, x + mask.width, y + mask.height)
+        alpha.paste(ImageChops.lighter(alpha.crop(box), mask), box)
+    bands = []
+    for y in range(L.height):
+        if alpha.crop((0, y, L.width, y + 1)).getbbox():
+            if bands and y - bands[-1][1] <= CHROME_BAND_GAP:
+                bands[-1][1] = y + 1
+            else:
+                bands.append([y, y + 1])
+    tiles = []
+    for top, bottom in bands:
+        x0, _, x1, _ = alpha.crop((0, top, L.width, bottom)).getbbox()
+        box = (x0, top, x1, bottom)
+        tiles.append((rgb.crop(box), alpha.crop(box), box[:2]))
+    return tuple(tiles)
+
+
+def draw_text(img, spec: CardSpec, L):
+    # Só os campos de cada viagem; o resto vem da camada de chrome. Cada bloco
+    # quebra e encolhe até caber na sua caixa do layout (card_text.fit_text)
+    accent_rgb = spec.accent_rgb
+    white = (255, 255, 255)
+
+    def block(text, box, x_center, y, fill, align="left", spacing=4):
+        # Desenha o bloco e devolve o y onde a tinta acaba
+        font, wrapped = fit_text(text, box, align, spacing)
+        draw_centered(img, wrapped, font, x_center, y, fill, align, spacing)
+        return y + text_bounds(wrapped, font, align, spacing)[3]
+
+    # Subtítulo
+    block(spec.subtitle.upper(), L.b_sub, L.center_x, L.subtitle_y, white, align="center")
+
+    # DESTINO (o maior tamanho que cabe) - o texto mais importante
+    block(spec.destination.upper(), L.b_dest, L.center_x, L.dest_y, accent_rgb, align="center")
+
+    # Preço
+    block(spec.price_label.upper(), L.b_plab, L.price_cx, L.price_top, white)
+    price_bottom = block(spec.price, L.b_price, L.price_cx, L.price_top + L.price_gap, accent_rgb)
+    block(spec.price_by.upper(), L.b_pby, L.price_cx, price_bottom + L.price_by_gap, white)
+
+    # Detalhes por baixo dos ícones
+    details = (f"{spec.origin}\n{spec.dates}", f"HOTEL\n{spec.hotel}", spec.meal, spec.baggage, spec.transfer)
+    for xc, txt in zip(L.icon_xs, details):
+        block(txt.upper(), L.b_icon, xc, L.icons_y, white, align="center", spacing=L.icon_spacing)
+
+
+# Opções de encode_card que cada formato usa; as outras não mudam os bytes
+ENCODE_OPTIONS = {
+    "PNG": ("compress_level", "optimize", "max_width"),
+    "JPEG": ("quality", "progressive", "optimize", "max_width"),
+    "WEBP": ("quality", "max_width"),
+}
+
+
+def encoding_options(image_format="PNG", **options):
+    # Argumentos de encode_card só com o que se aplica ao formato (e sem None),
+    # para que opções ignoradas não entrem na chave da cache de resultados
+    image_format = image_format.upper()
+    used = ENCODE_OPTIONS.get(image_format, ())
+    return dict({k: v for k, v in options.items() if k in used and v is not None}, image_format=image_format)
+
+
+def encode_card(img: Image.Image, image_format="PNG", quality=None, progressive=False,
+                compress_level=None, optimize=False, max_width=None) -> bytes:
+    # Converte uma só vez para RGB e codifica; max_width serve para previews
+    image_format = image_format.upper()
+    if image_format not in IMAGE_FORMATS:
+        raise ValueError(f"Formato de ficheiro desconhecido: {image_format}")
+    with stage("encode"):
+        if img.mode != "RGB":
+            img = img.convert("RGB")
+        if max_width and img.width > max_width:
+            img = img.resize((max_width, round(img.height * max_width / img.width)), Image.BILINEAR, reducing_gap=2.0)
+        if image_format == "JPEG":
+            params = {"quality": quality or 88, "progressive": progressive, "optimize": optimize}
+        elif image_format == "WEBP":
+            params = {"quality": quality or 85, "method": 4}
+        else:
+            params = {"compress_level": 6 if compress_level is None else compress_level, "optimize": optimize}
+        buf = BytesIO()
+        img.save(buf, format=image_format, **params)
+        return buf.getvalue()
+
+
+def encode_preview(img: Image.Image, max_width=PREVIEW_WIDTH) -> bytes:
+    # Pré-visualização leve, separada do ficheiro final
+    return encode_card(img, "JPEG", quality=80, max_width=max_width)
+
+
+def render_card_bytes(spec: CardSpec, background=None, image_format="PNG", quality="balanced", **encoding) -> bytes:
+    return encode_card(render_card(spec, background, quality), image_format, **encoding)
+
+
+def zip_cards(cards: dict, image_format="PNG", name="card", **encoding) -> bytes:
+    # Junta vários formatos do mesmo card num único ZIP
+    return zip_files({fmt: encode_card(img, image_format, **encoding) for fmt, img in cards.items()},
+                     image_format, name)
+
+
+def zip_files(files: dict, image_format="PNG", name="card") -> bytes:
+    # O mesmo, a partir de ficheiros já codificados ({formato: bytes})
+    ext = IMAGE_FORMATS[image_format.upper()][1]
+    buf = BytesIO()
+    with zipfile.ZipFile(buf, "w", compression=zipfile.ZIP_STORED) as zf:
+        for fmt, data in files.items():
+            zf.writestr(f"{name}_{slugify(fmt.split()[0])}.{ext}", data)
+    return buf.getvalue()
@@ -0,0 +1,191 @@
+import hashlib
+import json
+import os
+import threading
+from dataclasses import asdict
+
+from card_fonts import FONT_URLS, font_digest
+from card_http import CACHE_DIR
+from card_icons import icon_set_digest
+from card_profile import count as count_event
+from card_render import (RENDERER_VERSION, decode_plan, download_background, encode_card, encoding_options,
+                         render_card_formats)
+
+# --------------------
+# Cache de cards já gerados
+# --------------------
+# Cada ficheiro final (PNG/JPEG/WEBP) fica em disco com uma chave estável: o
+# sha256 do texto do card, formato, cor, bytes da imagem de fundo, versões das
+# fontes, ícones próprios (CARD_ICON_DIR), versão do renderer, opções de
+# codificação e o plano de descodificação do fundo (alvo e fundo intermédio,
+# que dependem dos formatos pedidos juntos). A mesma chave gera sempre os
+# mesmos bytes, por isso um pedido repetido (na app ou num lote corrido de
+# novo) devolve o ficheiro sem desenhar nada. Limite de tamanho com despejo
+# LRU (mtime = último acesso), como a cache HTTP.
+
+RESULTS_DIR = os.path.join(CACHE_DIR, "results")
+RESULTS_CACHE_MAX_BYTES = int(os.environ.get("CARD_RESULTS_CACHE_MAX_BYTES", str(512 * 1024 * 1024)))
+
+_lock = threading.Lock()
+_stats = {"hits": 0, "misses": 0, "stores": 0, "evictions": 0}
+
+
+def _count(key, n=1):
+    with _lock:
+        _stats[key] += n
+    count_event(f"result_{key}", n)
+
+
+def background_bytes(source, timeout=15):
+    # Bytes originais do fundo (para o digest e para o render); None se for uma imagem PIL
+    if isinstance(source, (bytes, bytearray)):
+        return bytes(source)
+    if hasattr(source, "read"):
+        if hasattr(source, "seek"):
+            source.seek(0)
+        return source.read()
+    if isinstance(source, str) and source.startswith(("http://", "https://")):
+        return download_background(source, timeout)
+    if isinstance(source, str) and source:
+        with open(source, "rb") as f:
+            return f.read()
+    if source is None or source == "":
+        raise RuntimeError("Nenhuma imagem de fundo indicada.")
+    return None
+
+
+def font_versions():
+    # None se alguma fonte faltar: o render usaria a fonte por defeito
+    versions = {name: font_digest(url) for name, url in FONT_URLS.items()}
+    return None if None in versions.values() else versions
+
+
+def result_key(spec, fmt, bg_digest, encoding, quality="balanced", fonts=None, plan=None):
+    values = asdict(spec)
+    values.pop("image_source")  # conta o conteúdo da imagem, não de onde veio
+    values["fmt"] = fmt
+    payload = {
+        "renderer": RENDERER_VERSION,
+        "spec": values,
+        "background": bg_digest,
+        "fonts": fonts if fonts is not None else font_versions(),
+        "encoding": {k: v for k, v in sorted(encoding.items()) if v is not None},
+        "quality": quality,
+        "decode": plan if plan is not None else decode_plan([fmt]),
+    }
+    icons = icon_set_digest()
+    if icons is not None:
+        payload["icons"] = icons
+    blob = json.dumps(payload, sort_keys=True, ensure_ascii=False).encode("utf-8")
+    return hashlib.sha256(blob).hexdigest()
+
+
+def _path(key):
+    return os.path.join(RESULTS_DIR, key[:2], f"{key}.bin")
+
+
+def get_result(key):
+    path = _path(key)
+    try:
+        with open(path, "rb") as f:
+            data = f.read()
+        os.utime(path)
+    except OSError:
+        _count("misses")
+        return None
+    _count("hits")
+    return data
+
+
+def put_result(key, data):
+    path = _path(key)
+    try:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp, "wb") as f:
+            f.write(data)
+        os.replace(tmp, path)
+    except OSError:
+        return
+    _count("stores")
+    _evict()
+
+
+def _evict():
+    entries = []
+    try:
+        for root, _, names in os.walk(RESULTS_DIR):
+            for name in names:
+                if name.endswith(".bin"):
+                    path = os.path.join(root, name)
+                    st = os.stat(path)
+                    entries.append((st.st_mtime, st.st_size, path))
+    except OSError:
+        return
+    total = sum(size for _, size, _ in entries)
+    for _, size, path in sorted(entries):
+        if total <= RESULTS_CACHE_MAX_BYTES:
+            break
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+        total -= size
+        _count("evictions")
+
+
+def render_encoded(spec, formats, background=None, encoding=None, quality="balanced", use_cache=True,
+                   decoded=None, bg_digest=None):
+    # {formato: bytes codificados}; só desenha os formatos que não estão na cache.
+    # decoded + bg_digest: fundo já descodificado (ex: cache partilhada da app)
+    # e o sha256 dos bytes originais; assim os bytes não são lidos nem
+    # descodificados outra vez (nem enviados a um worker)
+    formats = list(formats)
+    encoding = encoding_options(**(encoding or {}))
+    data = None
+    if bg_digest is None:
+        if background is None:
+            background = spec.image_source
+        data = background_bytes(background)
+        if data is not None:
+            bg_digest = hashlib.sha256(data).hexdigest()
+
+    # Os formatos que faltam são desenhados com o plano do pedido completo,
+    # para que os bytes de cada um correspondam à sua chave
+    plan = decode_plan(formats)
+    keys = {}
+    fonts = font_versions() if use_cache and bg_digest is not None else None
+    if fonts is not None:
+        keys = {fmt: result_key(spec, fmt, bg_digest, encoding, quality, fonts, plan) for fmt in formats}
+
+    out = {}
+    for fmt, key in keys.items():
+        cached = get_result(key)
+        if cached is not None:
+            out[fmt] = cached
+    missing = [fmt for fmt in formats if fmt not in out]
+    if missing:
+        if decoded is not None:
+            bg = decoded
+        else:
+            bg = data if data is not None else background
+        cards = render_card_formats(spec, missing, background=bg, quality=quality, plan=plan)
+        for fmt in missing:
+            out[fmt] = encode_card(cards[fmt], **encoding)
+            if fmt in keys:
+                put_result(keys[fmt], out[fmt])
+    return {fmt: out[fmt] for fmt in formats}
+
+
+def result_stats():
+    with _lock:
+        return dict(_stats)
+
+
+def clear_result_cache():
+    try:
+        for root, _, names in os.walk(RESULTS_DIR):
+            for name in names:
+                os.remove(os.path.join(root, name))
+    except OSError:
+        pass
@@ -0,0 +1,186 @@
+import multiprocessing
+import os
+import threading
+from collections import OrderedDict, deque
+from concurrent.futures import CancelledError, Future, InvalidStateError, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+# --------------------
+# Escalonador de renders partilhado
+# --------------------
+# Um pool de processos por servidor, partilhado por todas as sessões da app.
+# Cada sessão tem a sua fila e as sessões são servidas à vez (round-robin),
+# por isso quem pede muitos renders não passa à frente de quem pede um.
+# Um novo pedido da mesma sessão cancela os que ainda estão à espera (um render
+# já em curso termina, mas o resultado é descartado). Só entram no pool tantos
+# jobs quantos os workers; o resto espera aqui, onde a posição é conhecida.
+# Se um worker morrer (ex: OOM), o pool fica partido: os jobs em curso falham
+# com BrokenProcessPool e o escalonador cria um pool novo para os seguintes.
+
+DEFAULT_WORKERS = int(os.environ.get("CARD_RENDER_WORKERS", "0")) or os.cpu_count() or 1
+MAX_PENDING = 64
+
+
+class QueueFull(RuntimeError):
+    pass
+
+
+def _settle(future, result=None, exception=None):
+    # Um ticket cancelado entretanto (noutra thread) já não recebe resultado
+    try:
+        if exception is not None:
+            future.set_exception(exception)
+        else:
+            future.set_result(result)
+    except InvalidStateError:
+        pass
+
+
+class RenderTicket:
+    def __init__(self, scheduler, session, fn, args):
+        self.scheduler = scheduler
+        self.session = session
+        self.fn = fn
+        self.args = args
+        self.future = Future()
+        self.started = False
+
+    def position(self):
+        # 0 = a renderizar; n = há n - 1 jobs à frente
+        return self.scheduler.position(self)
+
+    def done(self):
+        return self.future.done()
+
+    def result(self, timeout=None):
+        return self.future.result(timeout)
+
+    def cancel(self):
+        return self.scheduler.cancel(self)
+
+
+class RenderScheduler:
+    def __init__(self, workers=None, max_pending=MAX_PENDING):
+        self.workers = workers or DEFAULT_WORKERS
+        self.max_pending = max_pending
+        self.pool = self._new_pool()
+        self._lock = threading.Lock()
+        self._queues = OrderedDict()  # sessão -> deque de tickets; a ordem é a vez
+        self._running = set()
+        self.stats = {"submitted": 0, "completed": 0, "cancelled": 0, "rejected": 0, "pool_restarts": 0}
+
+    def _new_pool(self):
+        # spawn: o servidor (Streamlit) tem muitas threads e fork não é seguro
+        return ProcessPoolExecutor(max_workers=self.workers, mp_context=multiprocessing.get_context("spawn"))
+
+    def submit(self, session, fn, *args, replace=True):
+        ticket = RenderTicket(self, session, fn, args)
+        with self._lock:
+            queue = self._queues.get(session)
+            if replace and queue:
+                for old in queue:
+                    old.future.cancel()
+                    self.stats["cancelled"] += 1
+                queue.clear()
+            if replace:
+                # Um render em curso desta sessão já não interessa
+                for old in self._running:
+                    if old.session == session:
+                        old.future.cancel()
+            if sum(len(q) for q in self._queues.values()) >= self.max_pending:
+                self.stats["rejected"] += 1
+                raise QueueFull("Demasiados renders em espera, tente de novo")
+            self._queues.setdefault(session, deque()).append(ticket)
+            self.stats["submitted"] += 1
+            started = self._dispatch()
+        self._watch(started)
+        return ticket
+
+    def _next(self):
+        # Próximo job em round-robin: a sessão servida passa para o fim da vez
+        for session, queue in list(self._queues.items()):
+            if not queue:
+                del self._queues[session]
+                continue
+            ticket = queue.popleft()
+            self._queues.move_to_end(session)
+            if not queue:
+                del self._queues[session]
+            return ticket
+        return None
+
+    def _dispatch(self):
+        # Chamado com o lock: enche os workers livres. Devolve os (ticket, future)
+        # iniciados; os callbacks registam-se já sem o lock (_watch), porque um
+        # future já terminado corre o callback logo ali
+        started = []
+        while len(self._running) < self.workers:
+            ticket = self._next()
+            if ticket is None:
+                break
+            try:
+                fut = self.pool.submit(ticket.fn, *ticket.args)
+            except BrokenProcessPool as e:
+                _settle(ticket.future, exception=e)
+                self._restart_pool()
+                continue
+            ticket.started = True
+            self._running.add(ticket)
+            started.append((ticket, fut))
+        return started
+
+    def _restart_pool(self):
+        # Chamado com o lock: o pool partido não aceita mais jobs
+        broken, self.pool = self.pool, self._new_pool()
+        broken.shutdown(wait=False, cancel_futures=True)
+        self.stats["pool_restarts"] += 1
+
+    def _watch(self, started):
+        for ticket, fut in started:
+            fut.add_done_callback(lambda f, t=ticket: self._finished(t, f))
+
+    def _finished(self, ticket, fut):
+        # Primeiro o resultado do ticket (quem espera por ele não fica pendurado
+        # mesmo que o próximo submit falhe), depois o lugar livre
+        try:
+            _settle(ticket.future, result=fut.result())
+        except CancelledError:
+            ticket.future.cancel()
+        except BaseException as e:
+            _settle(ticket.future, exception=e)
+        with self._lock:
+            self._running.discard(ticket)
+            self.stats["completed"] += 1
+            started = self._dispatch()
+        self._watch(started)
+
+    def position(self, ticket):
+        with self._lock:
+            if ticket.started:
+                return 0
+            # Quantos jobs saem antes deste, a ir às filas à vez
+            queues = [list(q) for q in self._queues.values()]
+            ahead = 0
+            for depth in range(max((len(q) for q in queues), default=0)):
+                for q in queues:
+                    if depth < len(q):
+                        if q[depth] is ticket:
+                            return ahead + 1
+                        ahead += 1
+            return 0
+
+    def cancel(self, ticket):
+        with self._lock:
+            queue = self._queues.get(ticket.session)
+            if queue and ticket in queue:
+                queue.remove(ticket)
+                self.stats["cancelled"] += 1
+        return ticket.future.cancel()
+
+    def metrics(self):
+        with self._lock:
+            return dict(self.stats, workers=self.workers, running=len(self._running),
+                        queued=sum(len(q) for q in self._queues.values()), sessions=len(self._queues))
+
+    def close(self):
+        self.pool.shutdown(wait=False, cancel_futures=True)
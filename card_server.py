@@ -0,0 +1,318 @@
+import argparse
+import base64
+import http.server
+import json
+import multiprocessing
+import os
+import re
+import sys
+import threading
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, TimeoutError as FutureTimeout
+from concurrent.futures.process import BrokenProcessPool
+from dataclasses import fields
+from urllib.parse import parse_qs, urlsplit
+
+from card_layout import resolve_formats
+from card_prefetch import is_url, prefetch_fonts
+from card_profile import collect_timings
+from card_render import BackgroundTooLarge, CardSpec, IMAGE_FORMATS, OVERLAYS, QUALITY
+from card_results import render_encoded
+
+# --------------------
+# Serviço HTTP de render
+# --------------------
+# POST /cards com o JSON de um CardSpec devolve a imagem (PNG, JPEG ou WEBP).
+# Os renders correm num pool de processos limitado; à frente dele há uma fila
+# com tamanho máximo: quando está cheia o pedido é recusado logo com 503 e
+# Retry-After, em vez de se acumular memória. Cada pedido tem um timeout (504).
+# Se um worker morrer (ex: OOM), o pool fica partido: os pedidos afetados
+# recebem 503 e o pool é recriado. GET /healthz (com o estado do pool) e
+# GET /metrics dão o estado do serviço.
+#
+#   curl -X POST localhost:8080/cards?format=webp -o card.webp \
+#        -d '{"destination": "Porto", "price": "299€", "image_source": "https://..."}'
+#
+# Campos da viagem em falta ficam vazios (nunca com os dados do exemplo).
+#
+# Campos extra no JSON: "image_base64" (fundo enviado no pedido) e, no query
+# string ou no JSON, "format" (png/jpeg/webp), "quality" (fast/balanced/best)
+# e "encode_quality" (1-100). O fundo por caminho local só é aceite com
+# --allow-local-files (ex: testes de carga sem rede).
+
+MAX_BODY_BYTES = 32 * 1024 * 1024
+MAX_CARD_PIXELS = 4096 * 4096
+LATENCY_WINDOW = 1000
+HEX_COLOR_RE = re.compile(r"#?[0-9a-fA-F]{6}")
+
+
+class RequestError(Exception):
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+
+def _render_request(spec, encoding, quality, background):
+    # Corre num processo do pool: (bytes, tempos)
+    with collect_timings() as timings:
+        data = render_encoded(spec, [spec.fmt], background, encoding, quality)[spec.fmt]
+    return data, timings.as_dict()
+
+
+class CardService:
+    def __init__(self, workers=None, queue_size=16, timeout=30.0, allow_local_files=False):
+        self.workers = workers or os.cpu_count() or 1
+        self.timeout = timeout
+        self.allow_local_files = allow_local_files
+        self.pool = self._new_pool()
+        # Lugares = a renderizar + à espera; sem lugar livre o pedido é recusado
+        self.capacity = self.workers + queue_size
+        self._slots = threading.BoundedSemaphore(self.capacity)
+        self._lock = threading.Lock()
+        self._latencies = deque(maxlen=LATENCY_WINDOW)
+        self._started = time.time()
+        self.stats = {"requests": 0, "ok": 0, "bad_request": 0, "failed": 0,
+                      "rejected": 0, "timeouts": 0, "in_flight": 0, "cache_hits": 0,
+                      "pool_restarts": 0}
+
+    def _new_pool(self):
+        # spawn: os pedidos chegam em threads do servidor e fork não é seguro
+        return ProcessPoolExecutor(max_workers=self.workers, mp_context=multiprocessing.get_context("spawn"))
+
+    def _restart_pool(self, broken):
+        # Só o primeiro a dar com o pool partido o substitui
+        with self._lock:
+            if self.pool is not broken:
+                return
+            self.pool = self._new_pool()
+            self.stats["pool_restarts"] += 1
+        broken.shutdown(wait=False, cancel_futures=True)
+
+    def _count(self, key, n=1):
+        with self._lock:
+            self.stats[key] += n
+
+    def parse(self, body, query):
+        try:
+            data = json.loads(body or b"{}")
+        except ValueError as e:
+            raise RequestError(400, f"JSON inválido: {e}")
+        if not isinstance(data, dict):
+            raise RequestError(400, "O corpo tem de ser um objeto JSON")
+        options = {k: v[-1] for k, v in query.items()}
+        # Tudo o que pode falhar é validado aqui (400), antes de ocupar um lugar no pool
+        image_format = options.get("format") or data.pop("format", "PNG")
+        if not isinstance(image_format, str):
+            raise RequestError(400, "format tem de ser um texto")
+        image_format = image_format.upper()
+        if image_format == "JPG":
+            image_format = "JPEG"
+        if image_format not in IMAGE_FORMATS:
+            raise RequestError(400, f"Formato de ficheiro desconhecido: {image_format}")
+        quality = options.get("quality") or data.pop("quality", "balanced")
+        if not isinstance(quality, str) or quality not in QUALITY:
+            raise RequestError(400, f"Qualidade desconhecida: {quality}")
+        encode_quality = options.get("encode_quality") or data.pop("encode_quality", None)
+        if encode_quality is not None:
+            try:
+                if isinstance(encode_quality, bool):
+                    raise ValueError
+                encode_quality = int(encode_quality)
+            except (TypeError, ValueError):
+                raise RequestError(400, f"encode_quality inválido: {encode_quality!r}")
+            if not 1 <= encode_quality <= 100:
+                raise RequestError(400, f"encode_quality tem de estar entre 1 e 100: {encode_quality}")
+        background = data.pop("image_base64", None)
+        if background is not None and not isinstance(background, str):
+            raise RequestError(400, "image_base64 tem de ser um texto")
+
+        for f in fields(CardSpec):
+            value = data.get(f.name)
+            if value is not None and not isinstance(value, str):
+                raise RequestError(400, f"{f.name} tem de ser um texto")
+        spec = CardSpec.from_dict(data)
+        try:
+            spec.fmt = resolve_formats([spec.fmt])[0]
+        except ValueError as e:
+            raise RequestError(400, str(e))
+        if not HEX_COLOR_RE.fullmatch(spec.accent_color):
+            raise RequestError(400, f"accent_color inválida (esperado #rrggbb): {spec.accent_color}")
+        if spec.overlay not in OVERLAYS:
+            raise RequestError(400, f"overlay desconhecido: {spec.overlay} (disponíveis: {', '.join(OVERLAYS)})")
+        width, height = spec.size
+        if width * height > MAX_CARD_PIXELS:
+            raise RequestError(400, f"Formato demasiado grande: {width}x{height}")
+        if background is not None:
+            try:
+                background = base64.b64decode(background, validate=True)
+            except ValueError as e:
+                raise RequestError(400, f"image_base64 inválido: {e}")
+        elif not is_url(spec.image_source) and not self.allow_local_files:
+            raise RequestError(400, "image_source tem de ser um URL http(s)")
+        encoding = {"image_format": image_format,
+                    "quality": encode_quality,
+                    "progressive": image_format == "JPEG"}
+        return spec, encoding, quality, background
+
+    def render(self, spec, encoding, quality, background):
+        if not self._slots.acquire(blocking=False):
+            self._count("rejected")
+            raise RequestError(503, "Fila cheia, tente mais tarde")
+        start = time.perf_counter()
+        self._count("in_flight")
+        pool = self.pool
+        try:
+            fut = pool.submit(_render_request, spec, encoding, quality, background)
+        except BaseException as e:
+            self._count("in_flight", -1)
+            self._slots.release()
+            if isinstance(e, BrokenProcessPool):
+                self._count("failed")
+                self._restart_pool(pool)
+                raise RequestError(503, "Pool de render reiniciado, tente de novo")
+            raise
+        # O lugar só é libertado quando o render termina mesmo (mesmo depois de um timeout)
+        fut.add_done_callback(lambda _: (self._count("in_flight", -1), self._slots.release()))
+        try:
+            data, timings = fut.result(timeout=self.timeout)
+        except FutureTimeout:
+            fut.cancel()
+            self._count("timeouts")
+            raise RequestError(504, f"Render excedeu {self.timeout:g}s")
+        except BrokenProcessPool:
+            self._count("failed")
+            self._restart_pool(pool)
+            raise RequestError(503, "Um processo de render terminou, tente de novo")
+        except BackgroundTooLarge as e:
+            self._count("failed")
+            raise RequestError(413, str(e))
+        except (ValueError, RuntimeError, OSError) as e:
+            self._count("failed")
+            raise RequestError(422, f"{type(e).__name__}: {e}")
+        except Exception as e:
+            self._count("failed")
+            raise RequestError(500, f"{type(e).__name__}: {e}")
+        with self._lock:
+            self.stats["ok"] += 1
+            self.stats["cache_hits"] += timings["counters"].get("result_hits", 0)
+            self._latencies.append(time.perf_counter() - start)
+        return data, timings
+
+    def health(self):
+        # Estado do pool: submeter um job vazio falha logo se estiver partido
+        pool = self.pool
+        try:
+            pool.submit(int)
+        except BrokenProcessPool:
+            self._restart_pool(pool)
+            return False, {"status": "degraded", "pool": "restarted",
+                           "pool_restarts": self.stats["pool_restarts"]}
+        return True, {"status": "ok", "pool": "ok", "workers": self.workers,
+                      "pool_restarts": self.stats["pool_restarts"]}
+
+    def metrics(self):
+        with self._lock:
+            stats = dict(self.stats)
+            latencies = sorted(self._latencies)
+
+        def pct(p):
+            return round(latencies[min(len(latencies) - 1, int(len(latencies) * p / 100))] * 1000, 2) if latencies else 0.0
+        return dict(stats, workers=self.workers, capacity=self.capacity,
+                    queued=max(0, stats["in_flight"] - self.workers),
+                    uptime_s=round(time.time() - self._started, 1),
+                    latency_ms={"p50": pct(50), "p90": pct(90), "p99": pct(99)})
+
+    def close(self):
+        self.pool.shutdown(wait=False, cancel_futures=True)
+
+
+class CardHandler(http.server.BaseHTTPRequestHandler):
+    service = None
+    quiet = False
+
+    def _send(self, status, body, content_type="application/json", headers=None):
+        if isinstance(body, (dict, list)):
+            body = json.dumps(body, ensure_ascii=False).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        for k, v in (headers or {}).items():
+            self.send_header(k, v)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        path = urlsplit(self.path).path
+        if path == "/healthz":
+            healthy, state = self.service.health()
+            self._send(200 if healthy else 503, state)
+        elif path == "/metrics":
+            self._send(200, self.service.metrics())
+        else:
+            self._send(404, {"error": "não encontrado"})
+
+    def do_POST(self):
+        url = urlsplit(self.path)
+        if url.path != "/cards":
+            self._send(404, {"error": "não encontrado"})
+            return
+        self.service._count("requests")
+        try:
+            length = int(self.headers.get("Content-Length") or 0)
+            if length > MAX_BODY_BYTES:
+                raise RequestError(413, "Pedido demasiado grande")
+            request = self.service.parse(self.rfile.read(length), parse_qs(url.query))
+            data, timings = self.service.render(*request)
+        except RequestError as e:
+            if e.status == 400:
+                self.service._count("bad_request")
+            headers = {"Retry-After": "1"} if e.status == 503 else None
+            self._send(e.status, {"error": str(e)}, headers=headers)
+            return
+        mime = IMAGE_FORMATS[request[1]["image_format"]][0]
+        self._send(200, data, mime, {"X-Render-Ms": str(timings["total_ms"])})
+
+    def log_message(self, fmt, *args):
+        if not self.quiet:
+            super().log_message(fmt, *args)
+
+
+def make_server(host="127.0.0.1", port=8080, **options):
+    quiet = options.pop("quiet", False)
+    service = CardService(**options)
+    handler = type("BoundCardHandler", (CardHandler,), {"service": service, "quiet": quiet})
+    httpd = http.server.ThreadingHTTPServer((host, port), handler)
+    httpd.daemon_threads = True
+    return httpd, service
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Serviço HTTP que gera cards (POST /cards).")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument("--workers", type=int, default=None, help="processos de render (por defeito: núcleos do CPU)")
+    parser.add_argument("--queue", type=int, default=16, help="pedidos em espera além dos que estão a renderizar")
+    parser.add_argument("--timeout", type=float, default=30, help="timeout de cada pedido em segundos")
+    parser.add_argument("--allow-local-files", action="store_true", help="aceita caminhos locais em image_source")
+    parser.add_argument("--quiet", action="store_true", help="não registar cada pedido")
+    args = parser.parse_args(argv)
+
+    for url, error in prefetch_fonts().items():
+        print(f"Aviso: fonte indisponível ({error}): {url}", file=sys.stderr)
+    httpd, service = make_server(args.host, args.port, workers=args.workers, queue_size=args.queue,
+                                 timeout=args.timeout, allow_local_files=args.allow_local_files,
+                                 quiet=args.quiet)
+    print(f"A servir em http://{args.host}:{httpd.server_address[1]} ({service.workers} workers)", file=sys.stderr)
+    try:
+        httpd.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        httpd.server_close()
+        service.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,79 @@
+import hashlib
+import os
+import time
+import uuid
+
+import streamlit as st
+
+from card_render import load_background
+from card_results import background_bytes
+from card_scheduler import RenderScheduler
+
+# --------------------
+# Caches das apps Streamlit
+# --------------------
+# Cada alteração num campo volta a correr o script inteiro. O fundo
+# descodificado e orientado fica em st.cache_resource (partilhado por todas as
+# sessões do servidor), com TTL e número máximo de entradas para a memória não
+# crescer com muitos utilizadores. Tanto a pré-visualização como o ficheiro
+# final recebem esse fundo já descodificado. A chave é o digest do upload ou o URL, mais
+# o tamanho pedido (o draft do JPEG depende dele). As fontes já são partilhadas
+# pelo processo (LRU em card_fonts) e não precisam de outra cache.
+# As imagens devolvidas são partilhadas: não as alterar.
+#
+# Os renders não correm na thread da sessão: vão para um RenderScheduler
+# único no servidor (pool de processos, fila justa por sessão), e a página
+# mostra a posição na fila enquanto espera, até RENDER_TIMEOUT segundos.
+
+BACKGROUND_TTL = 15 * 60
+BACKGROUND_MAX_ENTRIES = 8
+RENDER_TIMEOUT = float(os.environ.get("CARD_RENDER_TIMEOUT", "120"))
+
+
+@st.cache_resource(ttl=BACKGROUND_TTL, max_entries=BACKGROUND_MAX_ENTRIES, show_spinner=False)
+def _background(key, target_size, _source):
+    return load_background(_source, target_size=target_size)
+
+
+def cached_background(source, target_size):
+    # source: upload do Streamlit, URL ou caminho
+    if hasattr(source, "getvalue"):
+        data = source.getvalue()
+        return _background(hashlib.sha256(data).hexdigest(), tuple(target_size), data)
+    return _background(source, tuple(target_size), source)
+
+
+def background_digest(source):
+    # sha256 dos bytes originais do fundo (chave da cache de resultados)
+    data = source.getvalue() if hasattr(source, "getvalue") else background_bytes(source)
+    return hashlib.sha256(data).hexdigest()
+
+
+@st.cache_resource(show_spinner=False)
+def render_scheduler():
+    return RenderScheduler()
+
+
+def session_key():
+    return st.session_state.setdefault("render_session", uuid.uuid4().hex)
+
+
+def run_render(fn, *args, label="A gerar"):
+    # Submete ao pool partilhado e espera, mostrando a posição na fila. Se a
+    # sessão voltar a correr (novo input), o próximo pedido cancela este.
+    ticket = render_scheduler().submit(session_key(), fn, *args)
+    status = st.empty()
+    shown = None
+    deadline = time.monotonic() + RENDER_TIMEOUT
+    while not ticket.done():
+        if time.monotonic() > deadline:
+            ticket.cancel()
+            status.empty()
+            raise TimeoutError(f"{label}: sem resposta ao fim de {RENDER_TIMEOUT:.0f} s, tente de novo")
+        position = ticket.position()
+        if position != shown:
+            status.info(f"{label}… na fila (posição {position})" if position else f"{label}…")
+            shown = position
+        time.sleep(0.05)
+    status.empty()
+    return ticket.result()
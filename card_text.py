@@ -0,0 +1,207 @@
+import math
+import os
+import threading
+from collections import OrderedDict
+from functools import lru_cache
+
+from PIL import Image, ImageDraw
+
+from card_fonts import font_bytes, get_font
+
+# --------------------
+# Ajuste de texto a uma caixa
+# --------------------
+# Cada bloco do card (subtítulo, destino, preço, detalhes...) tem uma caixa
+# (largura, altura, máximo de linhas) e um tamanho máximo. A quebra de linha é
+# feita em píxeis, não em caracteres, e o tamanho é o maior que cabe. As
+# métricas de uma fonte escalam (quase) linearmente com o tamanho, por isso
+# durante a procura nada é desenhado nem medido com textbbox: as medidas saem
+# dos avanços e caixas de cada glifo, lidos uma vez no tamanho de referência e
+# escalados. A altura de um bloco vai do y onde é desenhado até ao fim da
+# tinta. Só o resultado final é confirmado com a medida real (o mesmo textbbox
+# em cache que depois centra o texto). O resultado fica em cache por
+# (texto, caixa).
+
+REF_SIZE = 100
+
+# Desenho "de medição" partilhado: textbbox não pinta nada
+_measure = ImageDraw.Draw(Image.new("L", (1, 1)))
+
+TEXT_FIT_CACHE_SIZE = 1024
+
+_glyphs = {}  # url da fonte -> {carácter: (avanço, x0, y0, x1, y1) no REF_SIZE}
+_line_tops = {}  # url da fonte -> base do "A" no REF_SIZE (passo entre linhas)
+
+
+def _glyph(url, ch):
+    table = _glyphs.setdefault(url, {})
+    g = table.get(ch)
+    if g is None:
+        ref = get_font(url, REF_SIZE)
+        g = table[ch] = (ref.getlength(ch),) + tuple(ref.getbbox(ch))
+    return g
+
+
+def _line_box(url, line):
+    # (largura, topo, base) da tinta de uma linha no REF_SIZE
+    glyphs = [_glyph(url, ch) for ch in line]
+    inked = [g for ch, g in zip(line, glyphs) if not ch.isspace()]
+    if not inked:
+        return 0.0, 0.0, 0.0
+    first = next(i for i, ch in enumerate(line) if not ch.isspace())
+    last = max(i for i, ch in enumerate(line) if not ch.isspace())
+    width = sum(g[0] for g in glyphs[first:last]) + glyphs[last][3] - glyphs[first][1]
+    return width, min(g[2] for g in inked), max(g[4] for g in inked)
+
+
+def _line_step(url):
+    step = _line_tops.get(url)
+    if step is None:
+        step = _line_tops[url] = get_font(url, REF_SIZE).getbbox("A")[3]
+    return step
+
+
+def wrap_text(text, url, size, max_width):
+    # Quebra gulosa por palavras, em píxeis; as quebras explícitas ("\n") ficam
+    k = size / REF_SIZE
+    lines = []
+    for paragraph in text.split("\n"):
+        line = ""
+        for word in paragraph.split():
+            candidate = f"{line} {word}" if line else word
+            if line and _line_box(url, candidate)[0] * k > max_width:
+                lines.append(line)
+                line = word
+            else:
+                line = candidate
+        lines.append(line)
+    return lines
+
+
+def _predict(lines, url, size, spacing):
+    # (largura, fundo) previstos do bloco, como text_bounds os mediria: a
+    # altura ocupada conta desde o y do desenho, não desde o topo da tinta
+    k = size / REF_SIZE
+    width = max(_line_box(url, line)[0] for line in lines) * k
+    step = _line_step(url) * k + spacing
+    return width, (len(lines) - 1) * step + _line_box(url, lines[-1])[2] * k
+
+
+def _block(text, box, size, spacing):
+    lines = wrap_text(text, box.font, size, box.width)
+    return lines, len(lines) <= box.max_lines
+
+
+@lru_cache(maxsize=TEXT_FIT_CACHE_SIZE)
+def fit_text_size(text, box, align="left", spacing=4):
+    # (tamanho, texto com as quebras) do maior tamanho em que o bloco cabe na caixa
+    lo, hi = box.min_size, max(box.min_size, box.max_size)
+    best = lo
+    while lo <= hi:
+        size = (lo + hi) // 2
+        lines, ok = _block(text, box, size, spacing)
+        w, h = _predict(lines, box.font, size, spacing)
+        if ok and w <= box.width and h <= box.height:
+            best, lo = size, size + 1
+        else:
+            hi = size - 1
+
+    # Confirmação com a medida real: o hinting pode desviar um ou dois pixels
+    def fits(size):
+        lines, ok = _block(text, box, size, spacing)
+        x0, _, x1, bottom = text_bounds("\n".join(lines), get_font(box.font, size), align, spacing)
+        return ok and x1 - x0 <= box.width and bottom <= box.height
+
+    size = best
+    while size > box.min_size and not fits(size):
+        size -= 1
+    while size < box.max_size and fits(size + 1):
+        size += 1
+    return size, "\n".join(_block(text, box, size, spacing)[0])
+
+
+def fit_text(text, box, align="left", spacing=4):
+    # (fonte, texto com as quebras) para desenhar o bloco dentro da caixa
+    if not text.strip() or font_bytes(box.font) is None:
+        # Sem a fonte não há métricas: tamanho do template, sem quebras
+        return get_font(box.font, box.max_size), text
+    size, wrapped = fit_text_size(text, box, align, spacing)
+    return get_font(box.font, size), wrapped
+
+
+# --------------------
+# Carimbos de texto
+# --------------------
+# Os mesmos textos (cabeçalho, rodapé, rótulos, ícones) repetem-se em todos os
+# cards. Cada texto é rasterizado uma vez numa máscara "L" e depois só é
+# carimbado com a cor pedida (paste com máscara), no próprio buffer do card.
+# A máscara depende do texto, da fonte (que já fixa o tamanho) e da parte
+# fracionária da posição; a cor só entra no carimbo.
+#
+# Os textos de cada viagem (destino, subtítulo...) também passam por aqui e
+# raramente se repetem, por isso a cache de máscaras é limitada em bytes (LRU),
+# não em entradas: um bloco de Story pesa centenas de KB. Uma máscara maior do
+# que um quarto do orçamento é desenhada e não fica guardada.
+
+STAMP_CACHE_SIZE = 512
+STAMP_CACHE_MAX_BYTES = int(os.environ.get("CARD_STAMP_CACHE_MAX_BYTES", str(16 * 1024 * 1024)))
+
+_stamp_lock = threading.Lock()
+_stamps = OrderedDict()  # (texto, fonte, frac, align, spacing) -> (máscara, (dx, dy))
+_stamp_bytes = 0
+
+
+@lru_cache(maxsize=STAMP_CACHE_SIZE)
+def text_bounds(text, font, align="left", spacing=4):
+    # textbbox a partir de (0, 0): bounds[3] é onde a tinta acaba abaixo de y
+    return _measure.textbbox((0, 0), text, font=font, align=align, spacing=spacing, stroke_width=0)
+
+
+def text_extent(text, font, align="left", spacing=4):
+    bbox = text_bounds(text, font, align, spacing)
+    return bbox[2] - bbox[0], bbox[3] - bbox[1]
+
+
+def _draw_stamp(text, font, frac, align, spacing):
+    bbox = _measure.textbbox(frac, text, font=font, align=align, spacing=spacing)
+    dx, dy = math.floor(bbox[0]), math.floor(bbox[1])
+    mask = Image.new("L", (max(1, math.ceil(bbox[2]) - dx), max(1, math.ceil(bbox[3]) - dy)))
+    ImageDraw.Draw(mask).text((frac[0] - dx, frac[1] - dy), text, font=font, fill=255,
+                              align=align, spacing=spacing)
+    return mask, (dx, dy)
+
+
+def text_stamp(text, font, frac=(0.0, 0.0), align="left", spacing=4):
+    # (máscara, (dx, dy)): o canto da máscara fica em (int(x) + dx, int(y) + dy)
+    global _stamp_bytes
+    key = (text, font, frac, align, spacing)
+    with _stamp_lock:
+        stamp = _stamps.get(key)
+        if stamp is not None:
+            _stamps.move_to_end(key)
+            return stamp
+    stamp = _draw_stamp(text, font, frac, align, spacing)
+    size = stamp[0].width * stamp[0].height
+    if size > STAMP_CACHE_MAX_BYTES // 4:
+        return stamp
+    with _stamp_lock:
+        if key not in _stamps:
+            _stamps[key] = stamp
+            _stamp_bytes += size
+            while _stamp_bytes > STAMP_CACHE_MAX_BYTES:
+                _, (old, _) = _stamps.popitem(last=False)
+                _stamp_bytes -= old.width * old.height
+    return stamp
+
+
+def place_stamp(xy, text, font, align="left", spacing=4):
+    # (máscara, canto) para desenhar o texto em xy, como ImageDraw.text
+    (fx, ix), (fy, iy) = math.modf(xy[0]), math.modf(xy[1])
+    mask, (dx, dy) = text_stamp(text, font, (fx, fy), align, spacing)
+    return mask, (int(ix) + dx, int(iy) + dy)
+
+
+def stamp_text(img, xy, text, font, fill=(255, 255, 255), align="left", spacing=4):
+    # Equivalente a ImageDraw.text(xy, ...), mas com a máscara da cache
+    mask, corner = place_stamp(xy, text, font, align, spacing)
+    img.paste(fill, corner, mask)
@@ -0,0 +1,92 @@
+import http.server
+import tempfile
+import threading
+import time
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+
+import card_http
+
+# --------------------
+# Cliente HTTP partilhado contra um servidor local
+# --------------------
+# Um servidor de teste em 127.0.0.1 conta os pedidos que recebe: oito threads
+# a pedir o mesmo URL ao mesmo tempo têm de dar um só download, e uma resposta
+# guardada sem validade (max-age=0) tem de ser revalidada com um 304.
+
+BODY = b"card-http-test" * 1024
+ETAG = '"v1"'
+
+
+class StubHandler(http.server.BaseHTTPRequestHandler):
+    hits = []  # (caminho, estado) de cada pedido recebido
+    delay = 0.3  # segura o primeiro pedido para os outros chegarem a meio
+
+    def log_message(self, *args):
+        pass
+
+    def do_GET(self):
+        if self.headers.get("If-None-Match") == ETAG:
+            self.hits.append((self.path, 304))
+            self.send_response(304)
+            self.send_header("ETag", ETAG)
+            self.end_headers()
+            return
+        self.hits.append((self.path, 200))
+        time.sleep(self.delay)
+        self.send_response(200)
+        self.send_header("Content-Length", str(len(BODY)))
+        self.send_header("ETag", ETAG)
+        self.send_header("Cache-Control", "max-age=0")
+        self.end_headers()
+        self.wfile.write(BODY)
+
+
+class CardHttpTest(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.server = http.server.ThreadingHTTPServer(("127.0.0.1", 0), StubHandler)
+        threading.Thread(target=cls.server.serve_forever, daemon=True).start()
+        cls.base = f"http://127.0.0.1:{cls.server.server_port}"
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.shutdown()
+        cls.server.server_close()
+
+    def setUp(self):
+        self._tmp = tempfile.TemporaryDirectory()
+        self._http_dir = card_http.HTTP_DIR
+        card_http.HTTP_DIR = self._tmp.name
+        StubHandler.hits.clear()
+
+    def tearDown(self):
+        card_http.HTTP_DIR = self._http_dir
+        self._tmp.cleanup()
+
+    def test_concurrent_requests_share_one_download(self):
+        url = f"{self.base}/dedup"
+        before = card_http.http_stats()
+        with ThreadPoolExecutor(max_workers=8) as pool:
+            bodies = list(pool.map(lambda _: card_http.fetch_bytes(url), range(8)))
+        after = card_http.http_stats()
+
+        self.assertEqual(bodies, [BODY] * 8)
+        self.assertEqual(StubHandler.hits, [("/dedup", 200)])
+        self.assertEqual(after["downloads"] - before["downloads"], 1)
+        self.assertEqual(after["deduplicated"] - before["deduplicated"], 7)
+
+    def test_stale_entry_is_revalidated_with_304(self):
+        url = f"{self.base}/revalidate"
+        self.assertEqual(card_http.fetch_bytes(url), BODY)
+        before = card_http.http_stats()
+        self.assertEqual(card_http.fetch_bytes(url), BODY)
+        after = card_http.http_stats()
+
+        self.assertEqual(StubHandler.hits, [("/revalidate", 200), ("/revalidate", 304)])
+        self.assertEqual(after["revalidated"] - before["revalidated"], 1)
+        self.assertEqual(after["downloads"] - before["downloads"], 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -1,102 +1,23 @@
-import streamlit as st
-from PIL import Image, ImageDraw, ImageFont, ExifTags
-import requests
-from io import BytesIO
-import textwrap
-
-st.set_page_config(page_title="Gerador de Card - Viagens", layout="centered")
-
-# --------------------
-# Constantes / Fontes
-# --------------------
-FONT_URLS = {
-    "regular": "https://github.com/google/fonts/raw/main/ofl/montserrat/Montserrat-Regular.ttf",
-    "semibold": "https://github.com/google/fonts/raw/main/ofl/montserrat/Montserrat-SemiBold.ttf",
-    "bold": "https://github.com/google/fonts/raw/main/ofl/montserrat/Montserrat-Bold.ttf",
-}
-
-# --------------------
-# Helpers
-# --------------------
-def download_bytes(url, timeout=12):
-    try:
-        r = requests.get(url, timeout=timeout)
-        r.raise_for_status()
-        return r.content
-    except Exception:
-        return None
-
-def safe_truetype_from_url(url, size):
-    data = download_bytes(url)
-    if data:
-        try:
-            return ImageFont.truetype(BytesIO(data), size=size)
-        except Exception:
-            pass
-    return ImageFont.load_default()
-
-def text_size(draw, text, font):
-    bbox = draw.textbbox((0, 0), text, font=font, stroke_width=0)
-    return bbox[2] - bbox[0], bbox[3] - bbox[1]
+from concurrent.futures import CancelledError
 
-def draw_centered(draw, text, font, x_center, y, fill=(255, 255, 255), align="center"):
-    w, h = text_size(draw, text, font)
-    draw.text((x_center - w / 2, y), text, font=font, fill=fill)
-    return w, h
-
-def fix_exif_orientation(img: Image.Image) -> Image.Image:
-    try:
-        exif = img._getexif()
-        if not exif:
-            return img
-        for orientation in ExifTags.TAGS.keys():
-            if ExifTags.TAGS[orientation] == 'Orientation':
-                o = exif.get(orientation, None)
-                if o == 3:
-                    return img.rotate(180, expand=True)
-                elif o == 6:
-                    return img.rotate(270, expand=True)
-                elif o == 8:
-                    return img.rotate(90, expand=True)
-                break
-    except Exception:
-        pass
-    return img
+import streamlit as st
 
-def cover_resize(img: Image.Image, target_w: int, target_h: int) -> Image.Image:
-    ratio_img = img.width / img.height
-    ratio_tar = target_w / target_h
-    if ratio_img > ratio_tar:
-        new_h = target_h
-        new_w = int(ratio_img * new_h)
-    else:
-        new_w = target_w
-        new_h = int(new_w / ratio_img)
-    img = img.resize((new_w, new_h), Image.LANCZOS)
-    left = (new_w - target_w) // 2
-    top = (new_h - target_h) // 2
-    return img.crop((left, top, left + target_w, top + target_h))
+from card_profile import timed_call
+from card_render import CardSpec, FORMATS, DEFAULT_IMAGE_URL, IMAGE_FORMATS, PREVIEW_SCALE, cover_target, encoding_options, format_size, render_previews, scaled_size, zip_files
+from card_results import render_encoded
+from card_scheduler import QueueFull
+from card_st_cache import background_digest, cached_background, run_render
 
-def fit_font_to_block(draw, text, url_bold, target_height, max_width, min_size=40, max_size=1200):
-    lo, hi = min_size, max_size
-    best = safe_truetype_from_url(url_bold, lo)
-    while lo <= hi:
-        mid = (lo + hi) // 2
-        f = safe_truetype_from_url(url_bold, mid)
-        w, h = text_size(draw, text, f)
-        if h <= target_height and w <= max_width:
-            best = f
-            lo = mid + 1
-        else:
-            hi = mid - 1
-    return best
+st.set_page_config(page_title="Gerador de Card - Viagens", layout="centered")
 
 # --------------------
 # UI
 # --------------------
 st.title("🧳 Gerador de Card de Viagem (template: NÁPOLES)")
 
-with st.form("inputs"):
+# Sem st.form: cada alteração volta a correr o script e atualiza a
+# pré-visualização (render reduzido); o render completo só acontece ao gerar o ficheiro
+with st.container():
     col_a, col_b = st.columns([2, 1])
 
     with col_a:
@@ -124,170 +45,116 @@ with st.form("inputs"):
             image_url = ""
         else:
             upload = None
-            image_url = st.text_input(
-                "URL da imagem",
-                "https://images.unsplash.com/photo-1512453979798-5ea266f8880c?q=80&w=1400&auto=format&fit=crop"
-            )
+            image_url = st.text_input("URL da imagem", DEFAULT_IMAGE_URL)
 
         st.write("---")
-        fmt = st.selectbox("Formato da imagem", ("Feed 1080×1350", "Quadrado 1080×1080", "Wide 1920×1080", "Story 1080×1920"), index=0)
-        outfile_name = st.text_input("Nome do ficheiro para download", "card_viagem.png")
+        fmt = st.selectbox("Formato da imagem", tuple(FORMATS), index=0)
+        all_formats = st.checkbox("Gerar todos os formatos (ZIP)", value=False)
+        quality_label = st.selectbox("Qualidade do fundo", ("Equilibrada", "Rápida", "Máxima"), index=0)
+        quality = {"Rápida": "fast", "Equilibrada": "balanced", "Máxima": "best"}[quality_label]
+        file_format = st.selectbox("Formato do ficheiro", tuple(IMAGE_FORMATS), index=0)
+        encode_quality = st.slider("Qualidade JPEG/WebP", 50, 100, 88, help="Ignorada em PNG")
+        debug = st.checkbox("Mostrar tempos do render (debug)", value=False)
+        outfile_name = st.text_input("Nome do ficheiro para download", "card_viagem")
         color_accent = st.color_picker("Cor de destaque (texto & ícones)", "#00ffae")
-
-    submit = st.form_submit_button("🎨 Gerar e Pré-visualizar")
+        overlay_label = st.selectbox("Escurecimento do fundo", ("Uniforme", "Gradiente", "Vinheta"), index=0)
+        overlay = {"Uniforme": "flat", "Gradiente": "gradient", "Vinheta": "vignette"}[overlay_label]
 
 # --------------------
 # Render
 # --------------------
-if submit:
-    # Tamanho por formato
-    if fmt == "Feed 1080×1350":
-        W, H = 1080, 1350
-    elif fmt == "Quadrado 1080×1080":
-        W, H = 1080, 1080
-    elif fmt == "Wide 1920×1080":
-        W, H = 1920, 1080
-    else:
-        W, H = 1080, 1920
-
-    # Carregar fundo
+def load_or_stop(source, target_size, digest=False):
+    # Fundo descodificado (e, para o ficheiro final, o digest dos bytes originais)
     try:
-        if upload is not None:
-            bg = Image.open(upload)
-        else:
-            data = download_bytes(image_url, timeout=15)
-            if not data:
-                raise RuntimeError("Falha ao fazer download da imagem.")
-            bg = Image.open(BytesIO(data))
-        bg = fix_exif_orientation(bg).convert("RGBA")
+        bg = cached_background(source, target_size)
+        return (bg, background_digest(source)) if digest else bg
     except Exception as e:
         st.error(f"Erro ao carregar imagem de fundo: {e}")
         st.stop()
 
-    # Ajustar imagem (cover)
-    bg = cover_resize(bg, W, H)
-
-    # Overlay escuro e base do desenho
-    overlay = Image.new("RGBA", (W, H), (0, 0, 0, 90))
-    canvas = Image.alpha_composite(bg, overlay)
-    draw = ImageDraw.Draw(canvas)
-
-    # Cor de destaque
-    accent_rgb = tuple(int(color_accent.lstrip("#")[i:i+2], 16) for i in (0, 2, 4))
-
-    # Fontes baseadas no template - TAMANHOS GRANDES
-    if fmt == "Feed 1080×1350":
-        f_top = safe_truetype_from_url(FONT_URLS["regular"], 50)
-        f_sub = safe_truetype_from_url(FONT_URLS["regular"], 85)
-        f_price = safe_truetype_from_url(FONT_URLS["bold"], 450)
-        f_plab = safe_truetype_from_url(FONT_URLS["semibold"], 65)
-        f_pby = safe_truetype_from_url(FONT_URLS["regular"], 55)
-        f_icon = safe_truetype_from_url(FONT_URLS["semibold"], 55)
-        f_icon_emoji = safe_truetype_from_url(FONT_URLS["semibold"], 120)
-        f_foot = safe_truetype_from_url(FONT_URLS["regular"], 45)
-        dest_min, dest_max = 600, 1200
-    elif fmt == "Quadrado 1080×1080":
-        f_top = safe_truetype_from_url(FONT_URLS["regular"], 48)
-        f_sub = safe_truetype_from_url(FONT_URLS["regular"], 80)
-        f_price = safe_truetype_from_url(FONT_URLS["bold"], 420)
-        f_plab = safe_truetype_from_url(FONT_URLS["semibold"], 62)
-        f_pby = safe_truetype_from_url(FONT_URLS["regular"], 52)
-        f_icon = safe_truetype_from_url(FONT_URLS["semibold"], 50)
-        f_icon_emoji = safe_truetype_from_url(FONT_URLS["semibold"], 110)
-        f_foot = safe_truetype_from_url(FONT_URLS["regular"], 40)
-        dest_min, dest_max = 550, 1150
-    elif fmt == "Wide 1920×1080":
-        f_top = safe_truetype_from_url(FONT_URLS["regular"], 56)
-        f_sub = safe_truetype_from_url(FONT_URLS["regular"], 92)
-        f_price = safe_truetype_from_url(FONT_URLS["bold"], 500)
-        f_plab = safe_truetype_from_url(FONT_URLS["semibold"], 72)
-        f_pby = safe_truetype_from_url(FONT_URLS["regular"], 62)
-        f_icon = safe_truetype_from_url(FONT_URLS["semibold"], 58)
-        f_icon_emoji = safe_truetype_from_url(FONT_URLS["semibold"], 130)
-        f_foot = safe_truetype_from_url(FONT_URLS["regular"], 48)
-        dest_min, dest_max = 620, 1250
-    else:  # Story 1080×1920
-        f_top = safe_truetype_from_url(FONT_URLS["regular"], 60)
-        f_sub = safe_truetype_from_url(FONT_URLS["regular"], 98)
-        f_price = safe_truetype_from_url(FONT_URLS["bold"], 540)
-        f_plab = safe_truetype_from_url(FONT_URLS["semibold"], 78)
-        f_pby = safe_truetype_from_url(FONT_URLS["regular"], 68)
-        f_icon = safe_truetype_from_url(FONT_URLS["semibold"], 62)
-        f_icon_emoji = safe_truetype_from_url(FONT_URLS["semibold"], 140)
-        f_foot = safe_truetype_from_url(FONT_URLS["regular"], 52)
-        dest_min, dest_max = 680, 1300
-
-    # Topo
-    top_y = 50
-    draw_centered(draw, "CONSULTOR INDEPENDENTE RNAVT3301", f_top, W // 2, top_y, fill=(255, 255, 255))
-    draw_centered(draw, "iCliGo travel consultant", f_top, W // 2, top_y + 50, fill=(255, 255, 255))
 
-    # Subtítulo - ajustar posição baseado no template
-    subtitle_y = 240 if fmt == "Feed 1080×1350" else (200 if fmt.startswith("Quadrado") or fmt.startswith("Wide") else 340)
-    subtitle_wrapped = "\n".join(textwrap.wrap(subtitle.upper(), width=40))
-    draw_centered(draw, subtitle_wrapped, f_sub, W // 2, subtitle_y, fill=(255, 255, 255))
-
-    # DESTINO (tamanho fixo MUITO GRANDE) - o texto mais importante
-    dest_text = destination.upper()
-    if fmt == "Feed 1080×1350":
-        f_dest = safe_truetype_from_url(FONT_URLS["bold"], 800)
-    elif fmt == "Quadrado 1080×1080":
-        f_dest = safe_truetype_from_url(FONT_URLS["bold"], 750)
-    elif fmt == "Wide 1920×1080":
-        f_dest = safe_truetype_from_url(FONT_URLS["bold"], 900)
-    else:  # Story
-        f_dest = safe_truetype_from_url(FONT_URLS["bold"], 1000)
-    
-    dest_y = 400 if fmt == "Feed 1080×1350" else (350 if fmt.startswith("Quadrado") or fmt.startswith("Wide") else 550)
-    w_dest, h_dest = text_size(draw, dest_text, f_dest)
-    draw.text((W/2 - w_dest/2, dest_y), dest_text, font=f_dest, fill=accent_rgb)
-
-    # Preço (MUITO GRANDE)
-    price_cx = int(W * 0.75)
-    price_top = 800 if fmt == "Feed 1080×1350" else (680 if fmt.startswith("Quadrado") else (620 if fmt.startswith("Wide") else 1080))
-    draw_centered(draw, price_label.upper(), f_plab, price_cx, price_top, fill=(255, 255, 255))
-    
-    # Preço com tamanho MUITO maior
-    if fmt == "Feed 1080×1350":
-        f_price_big = safe_truetype_from_url(FONT_URLS["bold"], 600)
-    elif fmt == "Quadrado 1080×1080":
-        f_price_big = safe_truetype_from_url(FONT_URLS["bold"], 550)
-    elif fmt == "Wide 1920×1080":
-        f_price_big = safe_truetype_from_url(FONT_URLS["bold"], 700)
-    else:  # Story
-        f_price_big = safe_truetype_from_url(FONT_URLS["bold"], 750)
-    
-    _, hp = draw_centered(draw, price, f_price_big, price_cx, price_top + 60, fill=accent_rgb)
-    draw_centered(draw, price_by.upper(), f_pby, price_cx, price_top + 60 + int(hp * 0.9), fill=(255, 255, 255))
-
-    # Ícones / detalhes
-    icons_y = 1120 if fmt == "Feed 1080×1350" else (920 if fmt.startswith("Quadrado") else (920 if fmt.startswith("Wide") else 1600))
-    icon_texts = [
-        (f"{origin}\n{dates}", "✈"),
-        (f"HOTEL\n{hotel}", "🏨"),
-        (meal, "🍽"),
-        (baggage, "💼"),
-        (transfer, "🚐"),
-    ]
-    n = len(icon_texts)
-    spacing = W // n
-    for i, (txt, ic) in enumerate(icon_texts):
-        xc = spacing * i + spacing // 2
-        draw_centered(draw, ic, f_icon_emoji, xc, icons_y - 100, fill=accent_rgb)
-        lines = txt.upper()
-        w_lbl, _ = text_size(draw, lines, f_icon)
-        draw.multiline_text((xc - w_lbl/2, icons_y), lines, font=f_icon, fill=(255, 255, 255), align="center", spacing=4)
-
-    # Rodapé
-    footer_y = 1290 if fmt == "Feed 1080×1350" else (1020 if fmt.startswith("Quadrado") or fmt.startswith("Wide") else 1850)
-    footer_text = "VALOR BASEADO EM 2 ADULTOS. PREÇOS SUJEITOS A ALTERAÇÕES."
-    draw_centered(draw, footer_text, f_foot, W // 2, footer_y, fill=(255, 255, 255))
+def render_or_stop(fn, *args, label, error):
+    # Fila cheia, pedido substituído ou timeout são do escalonador, não do card
+    try:
+        return run_render(fn, *args, label=label)
+    except QueueFull as e:
+        st.warning(f"{e}.")
+    except CancelledError:
+        pass  # um pedido mais recente desta sessão ficou com o lugar
+    except TimeoutError as e:
+        st.warning(str(e))
+    except Exception as e:
+        st.error(f"{error}: {e}")
+    st.stop()
+
+
+spec = CardSpec(
+    subtitle=subtitle,
+    destination=destination,
+    price=price,
+    price_label=price_label,
+    price_by=price_by,
+    origin=origin,
+    dates=dates,
+    hotel=hotel,
+    meal=meal,
+    baggage=baggage,
+    transfer=transfer,
+    accent_color=color_accent,
+    fmt=fmt,
+    image_source=image_url,
+    overlay=overlay,
+)
+source = upload if upload is not None else image_url
+formats = list(FORMATS) if all_formats else [fmt]
+full_target = cover_target([format_size(f) for f in formats])
+preview_target = cover_target([scaled_size(format_size(f), PREVIEW_SCALE) for f in formats])
+
+# Pré-visualização ao vivo: o mesmo layout a PREVIEW_SCALE, a cada alteração.
+# O render corre no pool partilhado do servidor, não na thread desta sessão.
+st.markdown("### Pré-visualização")
+if not source:
+    st.info("Carrega uma imagem ou indica o URL do fundo para ver a pré-visualização.")
+    st.stop()
+# O fundo descodificado vem da cache partilhada: mudar um texto não volta a descodificar
+bg = load_or_stop(source, preview_target)
+previews, preview_timings = render_or_stop(timed_call, render_previews, spec, formats, bg, PREVIEW_SCALE,
+                                           label="A preparar a pré-visualização",
+                                           error="Erro ao gerar a pré-visualização")
+if len(previews) > 1:
+    for tab, (name, data) in zip(st.tabs(list(previews)), previews.items()):
+        with tab:
+            st.image(data, use_container_width=True)
+else:
+    st.image(previews[fmt], use_container_width=True)
+
+# Render completo só a pedido (download)
+submit = st.button("🎨 Gerar ficheiro para download")
+if submit:
+    mime, ext = IMAGE_FORMATS[file_format]
+    base_name = (outfile_name or "card_viagem").rsplit(".", 1)[0]
+    # Só as opções do formato escolhido (a qualidade não conta em PNG)
+    encoding = encoding_options(file_format, quality=encode_quality, progressive=True,
+                                optimize=file_format == "JPEG", compress_level=6)
+
+    # Pedidos repetidos (mesmo texto, fundo, formato e opções) vêm da cache de
+    # resultados. O worker recebe o fundo já descodificado da cache partilhada
+    # (não os bytes originais, que teria de voltar a descodificar) e o digest para a chave
+    full_bg, bg_digest = load_or_stop(source, full_target, digest=True)
+    files, timings = render_or_stop(timed_call, render_encoded, spec, formats, None, encoding, quality, True,
+                                    full_bg, bg_digest, label="A gerar o ficheiro", error="Erro ao gerar o card")
+    if all_formats:
+        zip_data = zip_files(files, file_format, name=base_name)
+
+    if all_formats:
+        st.download_button("⬇️ Fazer download dos cards (ZIP)", data=zip_data, file_name=f"{base_name}.zip", mime="application/zip")
+    else:
+        st.download_button(f"⬇️ Fazer download do card ({file_format})", data=files[fmt], file_name=f"{base_name}.{ext}", mime=mime)
 
-    # Preview e download
-    st.markdown("### Pré-visualização")
-    st.image(canvas.convert("RGB"), use_container_width=True)
+    if debug:
+        with st.expander("⏱️ Tempos do render", expanded=True):
+            st.json(timings)
 
-    buf = BytesIO()
-    canvas.convert("RGB").save(buf, format="PNG")
-    buf.seek(0)
-    st.download_button("⬇️ Fazer download do card (PNG)", data=buf, file_name=outfile_name or "card_viagem.png", mime="image/png")
+if debug:
+    with st.expander("⏱️ Tempos da pré-visualização"):
+        st.json(preview_timings)
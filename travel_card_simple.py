@@ -1,25 +1,9 @@
-import streamlit as st
-from PIL import Image, ImageDraw, ImageFont
-import requests
 from io import BytesIO
 
-st.set_page_config(page_title="Gerador de Card de Viagem - Simples", layout="centered")
+from PIL import Image, ImageDraw
 
-# Função para baixar fontes
-def get_font(size):
-    try:
-        # Tenta usar uma fonte do sistema primeiro
-        return ImageFont.truetype("arial.ttf", size)
-    except:
-        try:
-            # Tenta outras fontes do sistema
-            return ImageFont.truetype("calibri.ttf", size)
-        except:
-            try:
-                return ImageFont.truetype("verdana.ttf", size)
-            except:
-                # Fallback para fonte padrão
-                return ImageFont.load_default()
+from card_fonts import system_font as get_font
+from card_render import darken, load_background
 
 # Função para criar o card
 def create_travel_card(destination, price, subtitle, image_url, width=1080, height=1350):
@@ -30,8 +14,7 @@ def create_travel_card(destination, price, subtitle, image_url, width=1080, heig
     # Carregar imagem de fundo se fornecida
     if image_url:
         try:
-            response = requests.get(image_url, timeout=10)
-            bg_img = Image.open(BytesIO(response.content))
+            bg_img = load_background(image_url, target_size=(width, height))
             bg_img = bg_img.resize((width, height))
             img.paste(bg_img, (0, 0))
             draw = ImageDraw.Draw(img)
@@ -39,8 +22,7 @@ def create_travel_card(destination, price, subtitle, image_url, width=1080, heig
             pass
     
     # Adicionar overlay escuro
-    overlay = Image.new('RGBA', (width, height), (0, 0, 0, 100))
-    img = Image.alpha_composite(img.convert('RGBA'), overlay).convert('RGB')
+    darken(img, alpha=100)
     draw = ImageDraw.Draw(img)
     
     # Cores
@@ -131,38 +113,54 @@ def create_travel_card(destination, price, subtitle, image_url, width=1080, heig
     
     return img
 
-# Interface Streamlit
-st.title("🧳 Gerador de Card de Viagem - Versão Simples")
+def main():
+    import streamlit as st
+
+    from card_st_cache import cached_background
+
+    st.set_page_config(page_title="Gerador de Card de Viagem - Simples", layout="centered")
 
-col1, col2 = st.columns([2, 1])
+    # Interface Streamlit
+    st.title("🧳 Gerador de Card de Viagem - Versão Simples")
 
-with col1:
-    st.subheader("Conteúdo")
-    destination = st.text_input("Destino", "NÁPOLES")
-    price = st.text_input("Preço", "409€")
-    subtitle = st.text_input("Subtítulo", "Entre o sabor da pizza e a vista do Vesúvio – Nápoles encanta")
+    col1, col2 = st.columns([2, 1])
 
-with col2:
-    st.subheader("Configurações")
-    image_url = st.text_input("URL da imagem de fundo", 
-                             "https://images.unsplash.com/photo-1512453979798-5ea266f8880c?q=80&w=1400&auto=format&fit=crop")
+    with col1:
+        st.subheader("Conteúdo")
+        destination = st.text_input("Destino", "NÁPOLES")
+        price = st.text_input("Preço", "409€")
+        subtitle = st.text_input("Subtítulo", "Entre o sabor da pizza e a vista do Vesúvio – Nápoles encanta")
+
+    with col2:
+        st.subheader("Configurações")
+        image_url = st.text_input("URL da imagem de fundo", 
+                                 "https://images.unsplash.com/photo-1512453979798-5ea266f8880c?q=80&w=1400&auto=format&fit=crop")
     
-    width = st.selectbox("Largura", [1080, 1920], index=0)
-    height = st.selectbox("Altura", [1350, 1080, 1920], index=0)
+        width = st.selectbox("Largura", [1080, 1920], index=0)
+        height = st.selectbox("Altura", [1350, 1080, 1920], index=0)
 
-if st.button("🎨 Gerar Card"):
-    with st.spinner("A gerar card..."):
-        try:
-            card = create_travel_card(destination, price, subtitle, image_url, width, height)
+    if st.button("🎨 Gerar Card"):
+        with st.spinner("A gerar card..."):
+            try:
+                # Fundo já descodificado da cache partilhada (se falhar, usa o URL como antes)
+                try:
+                    background = cached_background(image_url, (width, height)) if image_url else image_url
+                except Exception:
+                    background = image_url
+                card = create_travel_card(destination, price, subtitle, background, width, height)
             
-            st.markdown("### Pré-visualização")
-            st.image(card, use_column_width=True)
+                st.markdown("### Pré-visualização")
+                st.image(card, use_column_width=True)
             
-            # Download
-            buf = BytesIO()
-            card.save(buf, format="PNG")
-            buf.seek(0)
-            st.download_button("⬇️ Fazer download", data=buf, file_name="card_viagem.png", mime="image/png")
+                # Download
+                buf = BytesIO()
+                card.save(buf, format="PNG")
+                buf.seek(0)
+                st.download_button("⬇️ Fazer download", data=buf, file_name="card_viagem.png", mime="image/png")
             
-        except Exception as e:
-            st.error(f"Erro: {e}")
+            except Exception as e:
+                st.error(f"Erro: {e}")
+
+
+if __name__ == "__main__":
+    main()